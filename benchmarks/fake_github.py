@@ -0,0 +1,446 @@
+"""
+Local stand-in for the GitHub GraphQL API serving a synthetic ProjectV2 board.
+
+It answers every operation the action sends, keeps the comments it is asked
+to add, and can inject latency, primary rate limits and secondary rate limits.
+
+    python benchmarks/fake_github.py --items 10000 --fill-rate 0.9 --latency-ms 50 --port 8765
+
+GET /stats returns the requests, points and bytes served per operation and
+POST /reset clears them.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+OPERATION_PATTERN = re.compile(r'\b(?:query|mutation)\s+(\w+)')
+OWNER_PATTERN = re.compile(r'(\w+)\(login: \$owner\)')
+PROJECT_ALIAS_PATTERN = re.compile(r'project(\d+): (\w+)\(login')
+UPDATED_PATTERN = re.compile(r'updated:>=(\d{4}-\d{2}-\d{2})')
+NO_FIELD_PATTERN = re.compile(r'no:(?:"([^"]+)"|(\S+))')
+
+BASE_DATE = datetime(2024, 1, 1, tzinfo=timezone.utc)
+USERS = [f'user{index}' for index in range(50)]
+
+
+class Board:
+    """
+    Synthetic project board: every item is an issue with a deterministic
+    state, set of filled fields, assignees and comment history
+    """
+
+    def __init__(self, items=1000, fields=8, fill_rate=0.9, closed_rate=0.5, comment_density=3, seed=1):
+        generator = random.Random(seed)
+        self.size = items
+        self.fields = fields
+        self.closed = [generator.random() < closed_rate for _ in range(items)]
+        # Bit n is set when the n-th requested field has a value
+        self.filled = [
+            sum(1 << field for field in range(fields) if generator.random() < fill_rate)
+            for _ in range(items)
+        ]
+        self.comment_counts = [int(generator.expovariate(1 / comment_density)) if comment_density else 0
+                               for _ in range(items)]
+        self.assignees = [generator.sample(USERS, generator.randint(0, 3)) for _ in range(items)]
+        self.updated = [BASE_DATE + timedelta(minutes=index) for index in range(items)]
+        self.added_comments = {}
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def issue(self, index):
+        return {
+            'id': f'I_{index}',
+            'title': f'Synthetic issue {index}',
+            'number': index + 1,
+            'state': 'CLOSED' if self.closed[index] else 'OPEN',
+            'updatedAt': self.updated[index].strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'url': f'https://github.com/benchmark/scale/issues/{index + 1}',
+            'assignees': {'nodes': [
+                {'login': login, 'email': f'{login}@example.com'} for login in self.assignees[index]
+            ]},
+        }
+
+    def item(self, index, aliases):
+        node = {
+            'id': f'PVTI_{index}',
+            'updatedAt': self.updated[index].strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'content': self.issue(index),
+        }
+        for field, alias in enumerate(aliases):
+            filled = self.filled[index] >> (field % self.fields) & 1
+            node[alias] = {'__typename': 'ProjectV2ItemFieldTextValue'} if filled else None
+        return node
+
+    def matches(self, index, query, field_names):
+        """
+        Check an item against the subset of the project filter syntax the action uses
+        """
+        if not query:
+            return True
+        if 'is:closed' in query and not self.closed[index]:
+            return False
+        updated = UPDATED_PATTERN.search(query)
+        if updated and self.updated[index].date().isoformat() < updated.group(1):
+            return False
+        for quoted, plain in NO_FIELD_PATTERN.findall(query):
+            name = quoted or plain
+            if name in field_names and self.filled[index] >> (field_names.index(name) % self.fields) & 1:
+                return False
+        return True
+
+    def select(self, start, first, predicate):
+        """
+        Return up to first matching indexes from start on and whether more follow
+        """
+        page = []
+        for index in range(start, self.size):
+            if predicate(index):
+                if len(page) == first:
+                    return page, True
+                page.append(index)
+        return page, False
+
+    def count(self, query, field_names):
+        key = (query, tuple(field_names))
+        if key not in self.counts:
+            self.counts[key] = sum(1 for index in range(self.size) if self.matches(index, query, field_names))
+        return self.counts[key]
+
+    def items_page(self, aliases, field_names, after=None, query=None, first=100):
+        """
+        Return one items connection page; cursors are item offsets
+        """
+        page, has_next = self.select(int(after or 0), first, lambda index: self.matches(index, query, field_names))
+        return {
+            'nodes': [self.item(index, aliases) for index in page],
+            'pageInfo': {'endCursor': str(page[-1] + 1) if page else None, 'hasNextPage': has_next},
+            'totalCount': self.count(query, field_names),
+        }
+
+    def comments(self, index):
+        existing = [{'id': f'IC_{index}_{number}', 'body': f'Synthetic comment {number}',
+                     'createdAt': self.updated[index].isoformat(), 'author': {'login': 'someone'},
+                     'viewerDidAuthor': False} for number in range(self.comment_counts[index])]
+        with self.lock:
+            return existing + self.added_comments.get(index, [])
+
+    def comment(self, comment_id):
+        _, index, number = comment_id.split('_')
+        comments = self.comments(int(index))
+        return comments[int(number)] if int(number) < len(comments) else None
+
+    def update_comment(self, comment_id, body):
+        _, index, number = comment_id.split('_')
+        with self.lock:
+            for comment in self.added_comments.get(int(index), []):
+                if comment['id'] == comment_id:
+                    comment['body'] = body
+                    return True
+        return False
+
+    def add_comment(self, issue_id, body):
+        index = int(issue_id.split('_')[1])
+        with self.lock:
+            added = self.added_comments.setdefault(index, [])
+            added.append({
+                'id': f'IC_{index}_{self.comment_counts[index] + len(added)}', 'body': body,
+                'createdAt': datetime.now(timezone.utc).isoformat(), 'author': {'login': 'bot'}, 'viewerDidAuthor': True,
+            })
+
+
+class FakeGitHub:
+    """
+    Resolve the GraphQL operations of the action against a board, keeping
+    per-operation statistics and a primary rate limit budget
+    """
+
+    def __init__(self, board, latency_ms=0, jitter_ms=0, rate_limit=5000, secondary_rate=0.0, seed=1):
+        self.board = board
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.limit = rate_limit
+        self.secondary_rate = secondary_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.remaining = self.limit
+            self.reset_at = time.time() + 3600
+            self.requests = Counter()
+            self.points = Counter()
+            self.bytes = Counter()
+            self.throttled = Counter()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'requests': dict(self.requests),
+                'points': dict(self.points),
+                'bytes': dict(self.bytes),
+                'throttled': dict(self.throttled),
+                'total_requests': sum(self.requests.values()),
+                'total_points': sum(self.points.values()),
+                'total_bytes': sum(self.bytes.values()),
+            }
+
+    def rate_limit_headers(self):
+        return {
+            'X-RateLimit-Limit': str(self.limit),
+            'X-RateLimit-Remaining': str(max(0, self.remaining)),
+            'X-RateLimit-Reset': str(int(self.reset_at)),
+        }
+
+    def handle(self, document, variables):
+        """
+        Return (status, headers, body) for one GraphQL request
+        """
+        operation = (OPERATION_PATTERN.search(document) or [None, 'anonymous'])[1]
+        if self.latency or self.jitter:
+            time.sleep(self.latency + self.random.uniform(0, self.jitter))
+
+        with self.lock:
+            if time.time() >= self.reset_at:
+                self.remaining = self.limit
+                self.reset_at = time.time() + 3600
+
+            if self.secondary_rate and self.random.random() < self.secondary_rate:
+                self.throttled[operation] += 1
+                headers = dict(self.rate_limit_headers(), **{'Retry-After': '1'})
+                return 403, headers, {'message': 'You have exceeded a secondary rate limit. Please wait a few minutes before you try again.'}
+
+            if self.remaining <= 0:
+                self.throttled[operation] += 1
+                return 200, self.rate_limit_headers(), {
+                    'errors': [{'type': 'RATE_LIMITED', 'message': 'API rate limit exceeded'}]
+                }
+
+            self.remaining -= 1
+            self.requests[operation] += 1
+            self.points[operation] += 1
+            headers = self.rate_limit_headers()
+            rate_limit = {
+                'cost': 1,
+                'remaining': self.remaining,
+                'limit': self.limit,
+                'resetAt': datetime.fromtimestamp(self.reset_at, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            }
+
+        data = self.resolve(operation, document, variables)
+        if 'rateLimit' in document:
+            data['rateLimit'] = rate_limit
+        return 200, headers, {'data': data}
+
+    def resolve(self, operation, document, variables):
+        board = self.board
+        aliases = sorted((name for name in variables if re.fullmatch(r'field\d+', name)), key=lambda name: int(name[5:]))
+        field_names = [variables[alias] for alias in aliases]
+
+        if operation == 'GetProjectItems':
+            owner_type = OWNER_PATTERN.search(document).group(1)
+            items = board.items_page(aliases, field_names, after=variables.get('after'), query=variables.get('query'))
+            return {owner_type: {'projectV2': {'items': items}}}
+
+        if operation == 'GetProjectsFirstPages':
+            return {
+                f'project{index}': {'projectV2': {'items': board.items_page(
+                    aliases, field_names, query=variables.get(f'query{index}')
+                )}}
+                for index, owner_type in PROJECT_ALIAS_PATTERN.findall(document)
+            }
+
+        if operation == 'GetRepoClosedIssues':
+            page, has_next = board.select(int(variables.get('after') or 0), 100, lambda index: board.closed[index])
+            return {'repository': {'issues': {
+                'nodes': [board.issue(index) for index in page],
+                'pageInfo': {'endCursor': str(page[-1] + 1) if page else None, 'hasNextPage': has_next},
+                'totalCount': board.count('is:closed', []),
+            }}}
+
+        if operation == 'GetIssuesRecentComments':
+            last = variables.get('last', 100)
+            nodes = []
+            for issue_id in variables['ids']:
+                comments = board.comments(int(issue_id.split('_')[1]))
+                nodes.append({
+                    'id': issue_id,
+                    'comments': {
+                        'nodes': [
+                            {key: comment[key] for key in ['id', 'viewerDidAuthor', 'body']} for comment in comments[-last:]
+                        ],
+                        'pageInfo': {'hasPreviousPage': len(comments) > last},
+                    },
+                })
+            return {'nodes': nodes}
+
+        if operation == 'GetIssuesRecentCommentAuthors':
+            last = variables.get('last', 100)
+            nodes = []
+            for issue_id in variables['ids']:
+                comments = board.comments(int(issue_id.split('_')[1]))
+                start = max(0, len(comments) - last)
+                nodes.append({'id': issue_id, 'comments': comment_authors_page(comments, start, len(comments))})
+            return {'nodes': nodes}
+
+        if operation == 'GetIssueEarlierCommentAuthors':
+            # Cursors are comment offsets
+            comments = board.comments(int(variables['issueId'].split('_')[1]))
+            end = int(variables['before'])
+            return {'node': {'comments': comment_authors_page(comments, max(0, end - 100), end)}}
+
+        if operation == 'GetCommentBodies':
+            comments = [board.comment(comment_id) for comment_id in variables['ids']]
+            return {'nodes': [{'id': comment['id'], 'body': comment['body']} if comment else None for comment in comments]}
+
+        if operation == 'GetIssueComments':
+            comments = board.comments(int(variables['issueId'].split('_')[1]))
+            start = int(variables.get('afterCursor') or 0)
+            return {'node': {'comments': {
+                'nodes': comments[start:start + 100],
+                'pageInfo': {'endCursor': str(start + 100), 'hasNextPage': len(comments) > start + 100},
+            }}}
+
+        if operation == 'GetProjectItem':
+            index = int(variables['itemId'].split('_')[1])
+            node = board.item(index, aliases)
+            node['project'] = {'number': 1, 'owner': {'login': 'benchmark'}}
+            return {'node': node}
+
+        if operation == 'GetIssue':
+            return {'node': board.issue(int(variables['issueId'].split('_')[1]))}
+
+        if operation == 'GetIssueProjectItems':
+            index = int(variables['issueId'].split('_')[1])
+            item = board.item(index, aliases)
+            issue = item.pop('content')
+            item['project'] = {'number': 1, 'owner': {'login': 'benchmark'}}
+            issue['projectItems'] = {'nodes': [item]}
+            return {'node': issue}
+
+        if operation == 'AddIssueComments':
+            results = {}
+            for name, issue_id in variables.items():
+                if name.startswith('subject'):
+                    index = name[len('subject'):]
+                    board.add_comment(issue_id, variables[f'body{index}'])
+                    results[f'comment{index}'] = {'clientMutationId': None}
+            return results
+
+        if operation == 'UpdateIssueComments':
+            results = {}
+            for name, comment_id in variables.items():
+                if name.startswith('comment'):
+                    index = name[len('comment'):]
+                    if board.update_comment(comment_id, variables[f'body{index}']):
+                        results[f'comment{index}'] = {'clientMutationId': None}
+            return results
+
+        return {}
+
+
+def comment_authors_page(comments, start, end):
+    """
+    Return the comments from start to end as a connection of ids and authorship
+    """
+    return {
+        'nodes': [{'id': comment['id'], 'viewerDidAuthor': comment['viewerDidAuthor']} for comment in comments[start:end]],
+        'pageInfo': {'hasPreviousPage': start > 0, 'startCursor': str(start)},
+    }
+
+
+def create_handler(github):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers['Content-Length']))
+            if self.path == '/reset':
+                github.reset()
+                self.respond(200, {}, {'reset': True})
+                return
+
+            request = json.loads(body)
+            status, headers, document = github.handle(request['query'], request.get('variables') or {})
+            size = self.respond(status, headers, document)
+
+            operation = (OPERATION_PATTERN.search(request['query']) or [None, 'anonymous'])[1]
+            with github.lock:
+                github.bytes[operation] += size
+
+        def do_GET(self):
+            if self.path == '/stats':
+                self.respond(200, {}, github.stats())
+            else:
+                self.respond(404, {}, {'message': 'Not Found'})
+
+        def respond(self, status, headers, document):
+            body = json.dumps(document).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+            return len(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start(github, port=0):
+    """
+    Serve the fake API from a background thread and return the server
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', port), create_handler(github))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def add_arguments(parser):
+    parser.add_argument('--fields', type=int, default=8, help='number of required fields on the board')
+    parser.add_argument('--fill-rate', type=float, default=0.9, help='probability that a field has a value')
+    parser.add_argument('--closed-rate', type=float, default=0.5, help='probability that an issue is closed')
+    parser.add_argument('--comment-density', type=float, default=3, help='average number of comments per issue')
+    parser.add_argument('--latency-ms', type=float, default=0, help='latency added to every request')
+    parser.add_argument('--jitter-ms', type=float, default=0, help='random latency added on top')
+    parser.add_argument('--rate-limit', type=int, default=5000, help='primary rate limit points per hour')
+    parser.add_argument('--secondary-rate', type=float, default=0.0,
+                        help='probability that a request hits a secondary rate limit')
+    parser.add_argument('--seed', type=int, default=1, help='seed of the synthetic board')
+
+
+def create(args, items):
+    board = Board(items=items, fields=args.fields, fill_rate=args.fill_rate, closed_rate=args.closed_rate,
+                  comment_density=args.comment_density, seed=args.seed)
+    return FakeGitHub(board, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, rate_limit=args.rate_limit,
+                      secondary_rate=args.secondary_rate, seed=args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=1000, help='number of items on the board')
+    parser.add_argument('--port', type=int, default=8765, help='port to listen on')
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = start(create(args, args.items), args.port)
+    print(f'Serving a board of {args.items} items on http://127.0.0.1:{server.server_address[1]}/')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
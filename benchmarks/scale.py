@@ -0,0 +1,136 @@
+"""
+Run main.main() against the local fake GitHub API on synthetic boards of
+growing size and report the requests issued, wall time and peak memory.
+
+    python benchmarks/scale.py --sizes 1000 10000 100000 --latency-ms 20
+
+Each run starts a fresh process with an empty ledger, so the numbers cover
+a first run over the board. Runs are dry runs unless --post is given. Pass
+any fake_github.py option to shape the board or inject latency and rate limits.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import fake_github
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE = os.path.join(ROOT, 'src')
+
+FIELD_NAMES = ['Status', 'Due Date', 'Time Spent', 'Release', 'Estimate', 'Priority', 'Size', 'Week']
+FIELD_INPUTS = ['STATUS', 'DUEDATE', 'TIMESPENT', 'RELEASE', 'ESTIMATE', 'PRIORITY', 'SIZE', 'WEEK']
+
+
+def environment(port, directory, args):
+    env = dict(os.environ)
+    env.update({
+        'GITHUB_REPOSITORY_OWNER': 'benchmark',
+        'GITHUB_REPOSITORY': 'benchmark/scale',
+        'GITHUB_SERVER_URL': 'https://github.com',
+        'GITHUB_GRAPHQL_URL': f'http://127.0.0.1:{port}/',
+        'INPUT_REPOSITORY_OWNER_TYPE': 'organization',
+        'INPUT_ENTERPRISE_GITHUB': 'True',
+        'INPUT_DRY_RUN': 'False' if args.post else 'True',
+        'INPUT_GH_TOKEN': 'benchmark',
+        'INPUT_PROJECT_NUMBER': '1',
+        'INPUT_NOTIFICATION_TYPE': 'comment',
+        'INPUT_LEDGER_PATH': os.path.join(directory, 'ledger.sqlite'),
+        'INPUT_METRICS_PATH': directory,
+        'INPUT_EXECUTION_MODE': args.execution_mode,
+    })
+    for name, value in zip(FIELD_INPUTS, FIELD_NAMES):
+        env[f'INPUT_{name}_FIELD_NAME'] = value
+    return env
+
+
+def child():
+    """
+    Run the action once in this process and print its measurements
+    """
+    sys.path.insert(0, SOURCE)
+    import main
+
+    started_at = time.perf_counter()
+    main.main()
+    wall_time = time.perf_counter() - started_at
+
+    print(json.dumps({
+        'wall_time': wall_time,
+        # ru_maxrss is in kilobytes on Linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'stats': dict(main.run_stats),
+    }))
+
+
+def measure(size, args):
+    github = fake_github.create(args, size)
+    server = fake_github.start(github)
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--child'],
+                env=environment(server.server_address[1], directory, args),
+                stdout=subprocess.PIPE,
+                stderr=None if args.verbose else subprocess.DEVNULL,
+                check=True,
+                text=True
+            ).stdout
+            with open(os.path.join(directory, 'metrics.json')) as file:
+                metrics = json.load(file)
+    finally:
+        server.shutdown()
+
+    result = json.loads(output.strip().splitlines()[-1])
+    result['server'] = github.stats()
+    result['metrics'] = metrics
+    return result
+
+
+def report(size, result):
+    server = result['server']
+    stats = result['stats']
+    print(
+        f"{size:>8} items  {server['total_requests']:>6} requests  {server['total_points']:>6} points  "
+        f"{server['total_bytes'] / 1e6:>8.1f} MB  {result['wall_time']:>8.2f} s  {result['peak_rss_mb']:>7.1f} MB RSS  "
+        f"{stats.get('flagged', 0):>6} flagged  {stats.get('notified', 0):>6} notified"
+    )
+    for operation, requests in sorted(server['requests'].items()):
+        print(f'{"":>16}{operation}: {requests} requests, {server["bytes"].get(operation, 0) / 1e6:.1f} MB')
+    for operation, throttled in sorted(server['throttled'].items()):
+        print(f'{"":>16}{operation}: {throttled} requests rate limited')
+    for phase, histogram in result['metrics']['phases'].items():
+        print(f'{"":>16}{phase} phase: {histogram["sum"]:.2f} s over {histogram["count"]} steps, p95 {histogram["p95"]} s')
+
+
+def main():
+    if '--child' in sys.argv:
+        child()
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help='board sizes to run')
+    parser.add_argument('--execution-mode', choices=['sync', 'async'], default='sync', help='execution engine')
+    parser.add_argument('--post', action='store_true',
+                        help='post the notices too; they are paced by the content creation limits of 80 per minute')
+    parser.add_argument('--json', action='store_true', help='print the raw results as JSON')
+    parser.add_argument('--verbose', action='store_true', help='show the log of the action')
+    fake_github.add_arguments(parser)
+    args = parser.parse_args()
+
+    results = {}
+    for size in args.sizes:
+        results[size] = measure(size, args)
+        if not args.json:
+            report(size, results[size])
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Measure the time-to-first-request of the container entry point src/main.py.
+
+Every run starts a fresh interpreter on src/main.py against a local GraphQL
+endpoint that answers with an empty project, and records how long it takes
+from process start until the first request arrives and until the process exits.
+
+    python benchmarks/startup.py --runs 20
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENTRY_POINT = os.path.join(ROOT, 'src', 'main.py')
+
+EMPTY_PAGE = {
+    'nodes': [],
+    'totalCount': 0,
+    'pageInfo': {'endCursor': None, 'hasNextPage': False},
+}
+
+
+def create_handler(first_request):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            if not first_request.is_set():
+                first_request.at = time.perf_counter()
+                first_request.set()
+
+            self.rfile.read(int(self.headers['Content-Length']))
+            body = json.dumps({
+                'data': {
+                    'organization': {'projectV2': {'items': EMPTY_PAGE}},
+                    'repository': {'issues': EMPTY_PAGE},
+                }
+            }).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def environment(port, directory, enterprise):
+    env = dict(os.environ)
+    env.update({
+        'GITHUB_REPOSITORY_OWNER': 'benchmark',
+        'GITHUB_REPOSITORY': 'benchmark/startup',
+        'GITHUB_SERVER_URL': 'https://github.com',
+        'GITHUB_GRAPHQL_URL': f'http://127.0.0.1:{port}/',
+        'INPUT_REPOSITORY_OWNER_TYPE': 'organization',
+        'INPUT_ENTERPRISE_GITHUB': 'True' if enterprise else 'False',
+        'INPUT_DRY_RUN': 'True',
+        'INPUT_GH_TOKEN': 'benchmark',
+        'INPUT_PROJECT_NUMBER': '1',
+        'INPUT_NOTIFICATION_TYPE': 'comment',
+        'INPUT_LEDGER_PATH': os.path.join(directory, 'ledger.sqlite'),
+        'INPUT_STATUS_FIELD_NAME': 'Status',
+        'INPUT_DUEDATE_FIELD_NAME': 'Due Date',
+        'INPUT_TIMESPENT_FIELD_NAME': 'Time Spent',
+        'INPUT_RELEASE_FIELD_NAME': 'Release',
+        'INPUT_ESTIMATE_FIELD_NAME': 'Estimate',
+        'INPUT_PRIORITY_FIELD_NAME': 'Priority',
+        'INPUT_SIZE_FIELD_NAME': 'Size',
+        'INPUT_WEEK_FIELD_NAME': 'Week',
+    })
+    return env
+
+
+def measure(port, first_request, env):
+    """
+    Start the entry point once and return (time to first request, total run time) in seconds
+    """
+    first_request.clear()
+    started_at = time.perf_counter()
+    subprocess.run([sys.executable, ENTRY_POINT], env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    finished_at = time.perf_counter()
+
+    if not first_request.is_set():
+        raise RuntimeError('The entry point exited without sending a request')
+    return first_request.at - started_at, finished_at - started_at
+
+
+def describe(label, samples):
+    samples = [sample * 1000 for sample in samples]
+    return (f'{label:<24} min {min(samples):7.1f} ms   median {statistics.median(samples):7.1f} ms   '
+            f'max {max(samples):7.1f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10, help='number of measured runs')
+    parser.add_argument('--repository', action='store_true', help='scan repository issues instead of a project')
+    args = parser.parse_args()
+
+    first_request = threading.Event()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), create_handler(first_request))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            env = environment(server.server_address[1], directory, enterprise=not args.repository)
+
+            # Warm the filesystem and bytecode caches
+            measure(server.server_address[1], first_request, env)
+
+            results = [measure(server.server_address[1], first_request, env) for _ in range(args.runs)]
+    finally:
+        server.shutdown()
+
+    print(f'{args.runs} runs of {os.path.relpath(ENTRY_POINT, ROOT)}')
+    print(describe('time to first request', [first for first, _ in results]))
+    print(describe('total run time', [total for _, total in results]))
+
+
+if __name__ == '__main__':
+    main()
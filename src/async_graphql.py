@@ -0,0 +1,340 @@
+import asyncio
+import logging
+import time
+import config
+import graphql
+import queries
+from metrics import get_metrics
+from client import GraphQLError, RequestError, is_mutation, page_cursor, response_error, retry_delay
+from ratelimit import operation_name
+import profiling
+import tracing
+
+_client = None
+
+
+class AsyncGraphQLClient:
+    """
+    Asyncio counterpart of client.GraphQLClient running requests concurrently
+    on an httpx.AsyncClient, with at most max_in_flight requests at a time
+    """
+
+    def __init__(self, endpoint, token, max_in_flight=8, scheduler=None, metrics=None, max_retries=3,
+                 backoff_base=1.0, backoff_cap=60.0, connect_timeout=10, read_timeout=30):
+        import httpx
+
+        try:
+            import h2  # noqa: F401
+            http2 = True
+        except ImportError:
+            http2 = False
+
+        self.httpx = httpx
+        self.endpoint = endpoint
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.session = httpx.AsyncClient(
+            http2=http2,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight)
+        )
+        self.semaphore = asyncio.Semaphore(max_in_flight)
+        self.scheduler = scheduler
+        self.metrics = metrics
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+
+    async def execute(self, query, variables=None):
+        """
+        Send the document with its variables and return the decoded response body,
+        retrying transport failures, server errors and secondary rate limits.
+        Mutations are only sent again when the server did not run them.
+        """
+        operation = operation_name(query)
+        with profiling.section(f'graphql {operation}'):
+            return await self.retry(lambda: self._send(operation, query, variables), operation, resendable_only=is_mutation(query))
+
+    async def retry(self, action, description, errors=(RequestError,), resendable_only=False):
+        """
+        Await action() under the retry policy of client.retry
+        """
+        attempt = 0
+        while True:
+            try:
+                return await action()
+            except errors as e:
+                delay = retry_delay(e, attempt, description, self.max_retries, self.backoff_base, self.backoff_cap, resendable_only)
+                if delay is None:
+                    raise
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    async def _send(self, operation, query, variables):
+        if self.scheduler:
+            # Sleep on the event loop so a paced request holds no thread
+            for wait in self.scheduler.request_waits(operation):
+                await asyncio.sleep(wait)
+
+        async with self.semaphore:
+            with tracing.span(operation, 'graphql', operation=operation, cursor=page_cursor(variables)) as span:
+                started_at = time.perf_counter()
+                try:
+                    response = await self.session.post(
+                        self.endpoint,
+                        json={"query": query, "variables": variables or {}},
+                        headers=self.headers
+                    )
+                except self.httpx.HTTPError as e:
+                    error = RequestError(e)
+                    # Nothing reached the server when the connection could not be opened
+                    error.resendable = isinstance(e, (self.httpx.ConnectError, self.httpx.ConnectTimeout))
+                    raise error from e
+                span.update(status=response.status_code, response_size=len(response.content))
+            if self.metrics:
+                self.metrics.record_request(operation, time.perf_counter() - started_at, len(response.content))
+
+        try:
+            data = response.json()
+        except ValueError as e:
+            error = response_error(response, None)
+            if error is None:
+                error = RequestError(f'Invalid JSON response (HTTP {response.status_code})')
+                error.transient = False
+            raise error from e
+
+        error = response_error(response, data)
+        if error:
+            raise error
+
+        if self.scheduler:
+            cost = self.scheduler.record(operation, response.headers, data)
+            if self.metrics:
+                self.metrics.record_points(operation, cost)
+
+        return data
+
+    async def close(self):
+        await self.session.aclose()
+
+
+def get_client():
+    """
+    Return the asyncio GraphQL client of the running engine, sharing the rate
+    limit budget with the synchronous client
+    """
+    global _client
+    if _client is None:
+        _client = AsyncGraphQLClient(
+            config.api_endpoint,
+            config.gh_token,
+            max_in_flight=config.max_in_flight,
+            scheduler=graphql.get_client().scheduler,
+            metrics=graphql.get_client().metrics,
+            max_retries=config.max_retries,
+            connect_timeout=config.connect_timeout,
+            read_timeout=config.read_timeout
+        )
+    return _client
+
+async def close_client():
+    """
+    Close the asyncio client; it is bound to the event loop that used it
+    """
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+async def get_issue_comments(issue_id):
+    """
+    Return every comment of the given issue, oldest first
+    """
+    comments = []
+    after = None
+    with tracing.span('get_issue_comments', 'pagination', issue=issue_id, pages=0) as span:
+        while True:
+            variables = {
+                'issueId': issue_id,
+                'afterCursor': after
+            }
+
+            async def fetch_page():
+                data = await get_client().execute(queries.ISSUE_COMMENTS_QUERY, variables)
+                if 'errors' in data:
+                    raise GraphQLError(data['errors'])
+                return data.get('data', {}).get('node', {}).get('comments', {})
+
+            comments_data = await get_client().retry(fetch_page, 'Page fetch', errors=(GraphQLError,))
+            get_metrics().record_page('GetIssueComments')
+            comments.extend(comments_data.get('nodes', []))
+            span.update(pages=span['pages'] + 1, items=len(comments))
+
+            pageinfo = comments_data.get('pageInfo', {})
+            if not pageinfo.get('hasNextPage'):
+                return comments
+
+            # Set the cursor for the next page
+            after = pageinfo.get('endCursor')
+
+async def get_issues_recent_comments(issue_ids, last=100, query=queries.ISSUES_RECENT_COMMENTS_QUERY):
+    """
+    Fetch the most recent comments of a batch of issues, halving the batch
+    while it is too expensive for the server to resolve
+    """
+    async def fetch_batch():
+        variables = {
+            'ids': issue_ids,
+            'last': last
+        }
+        data = await get_client().execute(query, variables)
+        return graphql.recent_comments_result(data)
+
+    try:
+        return await get_client().retry(fetch_batch, 'Comment batch', errors=(GraphQLError,))
+    except GraphQLError as e:
+        if len(issue_ids) == 1 or not graphql.is_batch_too_large(e):
+            raise
+
+    middle = len(issue_ids) // 2
+    logging.warning(f"Comment batch too large, retrying with {middle} issues per request")
+    halves = await asyncio.gather(
+        get_issues_recent_comments(issue_ids[:middle], last=last, query=query),
+        get_issues_recent_comments(issue_ids[middle:], last=last, query=query)
+    )
+    return {**halves[0], **halves[1]}
+
+async def get_issues_comments(issue_ids, batch_size=50, last=100):
+    """
+    Return {issue_id: (comments, complete)} for every given issue whose
+    comments could be read, fetching the batches concurrently. complete is False when the issue has older
+    comments than the ones returned.
+    """
+    batch_size = graphql.comment_batch_limit(batch_size, last)
+    batches = [issue_ids[start:start + batch_size] for start in range(0, len(issue_ids), batch_size)]
+
+    results = {}
+    for comments_by_issue in await asyncio.gather(*(get_issues_recent_comments(batch, last=last) for batch in batches)):
+        results.update(comments_by_issue)
+
+    return {
+        issue_id: (
+            (results.get(issue_id) or {}).get('nodes', []),
+            not (results.get(issue_id) or {}).get('pageInfo', {}).get('hasPreviousPage')
+        )
+        for issue_id in issue_ids if issue_id in results
+    }
+
+async def get_comment_bodies(comment_ids):
+    """
+    Fetch the bodies of the given comments concurrently, MAX_NODE_IDS per
+    request, keyed by comment id
+    """
+    async def fetch_chunk(chunk):
+        async def fetch():
+            data = await get_client().execute(queries.COMMENT_BODIES_QUERY, {'ids': chunk})
+            return graphql.comment_bodies_result(data)
+        return await get_client().retry(fetch, 'Comment bodies fetch', errors=(GraphQLError,))
+
+    bodies = {}
+    chunks = [comment_ids[start:start + graphql.MAX_NODE_IDS] for start in range(0, len(comment_ids), graphql.MAX_NODE_IDS)]
+    for chunk_bodies in await asyncio.gather(*(fetch_chunk(chunk) for chunk in chunks)):
+        bodies.update(chunk_bodies)
+    return bodies
+
+async def get_issues_own_comments(issue_ids, batch_size=50, last=100):
+    """
+    Return {issue_id: (comments, before)} for every given issue whose comments
+    could be read, fetching the batches concurrently. comments are the issue's most recent comments written
+    by the token's own account, newest first, with their bodies; before is the
+    cursor of its older comments, or None when there are none.
+    """
+    query = queries.ISSUES_RECENT_COMMENT_AUTHORS_QUERY
+    batch_size = graphql.comment_batch_limit(batch_size, last)
+    batches = [issue_ids[start:start + batch_size] for start in range(0, len(issue_ids), batch_size)]
+
+    results = {}
+    for comments_by_issue in await asyncio.gather(*(get_issues_recent_comments(batch, last=last, query=query) for batch in batches)):
+        results.update(comments_by_issue)
+
+    own_ids = {issue_id: graphql.own_comment_ids(comments or {}) for issue_id, comments in results.items()}
+    bodies = await get_comment_bodies([comment_id for ids in own_ids.values() for comment_id in ids])
+
+    return {
+        issue_id: (
+            [{'id': comment_id, 'viewerDidAuthor': True, 'body': bodies.get(comment_id, '')} for comment_id in own_ids[issue_id]],
+            graphql.earlier_cursor(results[issue_id] or {})
+        )
+        for issue_id in issue_ids
+        # A notice whose body could not be read would be posted again
+        if issue_id in results and bodies.keys() >= set(own_ids[issue_id])
+    }
+
+async def get_issue_own_comments(issue_id, before):
+    """
+    Yield the comments of the given issue written by the token's own account,
+    page by page from the before cursor back to the first comment, newest first
+    """
+    with tracing.span('get_issue_comments', 'pagination', issue=issue_id, pages=0) as span:
+        while before:
+            variables = {
+                'issueId': issue_id,
+                'before': before
+            }
+
+            async def fetch_page():
+                data = await get_client().execute(queries.ISSUE_EARLIER_COMMENT_AUTHORS_QUERY, variables)
+                if 'errors' in data:
+                    raise GraphQLError(data['errors'])
+                return data.get('data', {}).get('node', {}).get('comments', {})
+
+            comments_data = await get_client().retry(fetch_page, 'Page fetch', errors=(GraphQLError,))
+            get_metrics().record_page('GetIssueEarlierCommentAuthors')
+            span['pages'] += 1
+
+            own_ids = graphql.own_comment_ids(comments_data)
+            if own_ids:
+                bodies = await get_comment_bodies(own_ids)
+                yield [{'id': comment_id, 'viewerDidAuthor': True, 'body': bodies.get(comment_id, '')} for comment_id in own_ids]
+
+            before = graphql.earlier_cursor(comments_data)
+
+async def add_issue_comments(comments):
+    """
+    Add several comments in one request through aliased addComment mutations
+    and return whether each issue got its comment, keyed by issue id
+    """
+    mutation, variables, aliases = graphql.add_issue_comments_request(comments)
+
+    scheduler = get_client().scheduler
+    if scheduler:
+        for wait in scheduler.content_waits(len(comments)):
+            await asyncio.sleep(wait)
+
+    try:
+        data = await get_client().execute(mutation, variables)
+    except RequestError as e:
+        logging.error(f"Request error: {e}")
+        return {issue_id: False for issue_id, _ in comments}
+
+    return graphql.add_issue_comments_results(data, aliases, comments)
+
+async def update_issue_comments(comments):
+    """
+    Edit several comments in place in one request through aliased
+    updateIssueComment mutations and return whether each comment was updated,
+    keyed by comment id
+    """
+    mutation, variables, aliases = graphql.update_issue_comments_request(comments)
+
+    scheduler = get_client().scheduler
+    if scheduler:
+        for wait in scheduler.content_waits(len(comments)):
+            await asyncio.sleep(wait)
+
+    try:
+        data = await get_client().execute(mutation, variables)
+    except RequestError as e:
+        logging.error(f"Request error: {e}")
+        return {comment_id: False for comment_id, _ in comments}
+
+    return graphql.add_issue_comments_results(data, aliases, comments)
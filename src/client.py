@@ -0,0 +1,291 @@
+import logging
+import random
+import time
+from ratelimit import operation_name
+import profiling
+import tracing
+
+# Errors GitHub returns for failures that are worth retrying
+TRANSIENT_ERROR_MESSAGES = ['timeout', 'timedout', 'something went wrong', 'secondary rate limit']
+TRANSIENT_ERROR_TYPES = ['INTERNAL', 'SERVICE_UNAVAILABLE', 'TIMEOUT']
+
+
+class RequestError(Exception):
+    """Raised when the transport fails to deliver a request or read its response"""
+
+    transient = True
+    retry_after = None
+    # Set when the server certainly did not run the request, so even a mutation can be sent again
+    resendable = False
+    # HTTP status of a request the server answered with an error status
+    status = None
+
+    @property
+    def refused(self):
+        """Whether the server refused the request for good, e.g. for a revoked token"""
+        return self.status is not None and not self.transient
+
+
+class GraphQLError(RequestError):
+    """Raised when the response body carries GraphQL errors"""
+
+    def __init__(self, errors):
+        super().__init__(f'GraphQL errors: {errors}')
+        self.errors = errors
+
+    @property
+    def transient(self):
+        for error in self.errors:
+            message = str(error.get('message', '')).lower()
+            if error.get('type') in TRANSIENT_ERROR_TYPES:
+                return True
+            if any(pattern in message for pattern in TRANSIENT_ERROR_MESSAGES):
+                return True
+        return False
+
+
+class RequestsTransport:
+    """
+    Keep-alive transport backed by a pooled requests session
+    """
+
+    def __init__(self, pool_size=10, connect_timeout=10, read_timeout=30):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.requests = requests
+        self.session = requests.Session()
+        self.timeout = (connect_timeout, read_timeout)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def post(self, url, payload, headers):
+        try:
+            return self.session.post(url, json=payload, headers=headers, timeout=self.timeout)
+        except self.requests.RequestException as e:
+            error = RequestError(e)
+            error.resendable = self.connect_failed(e)
+            raise error from e
+
+    def connect_failed(self, error):
+        """
+        Check whether the request failed before a connection to the server was open
+        """
+        from urllib3.exceptions import NewConnectionError
+
+        if isinstance(error, self.requests.ConnectTimeout):
+            return True
+        reason = getattr(error.args[0], 'reason', None) if error.args else None
+        return isinstance(error, self.requests.ConnectionError) and isinstance(reason, NewConnectionError)
+
+    def close(self):
+        self.session.close()
+
+
+class HttpxTransport:
+    """
+    Keep-alive transport backed by httpx, multiplexing requests over HTTP/2
+    """
+
+    def __init__(self, pool_size=10, connect_timeout=10, read_timeout=30):
+        import httpx
+
+        self.httpx = httpx
+        self.session = httpx.Client(
+            http2=True,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        )
+
+    def post(self, url, payload, headers):
+        try:
+            return self.session.post(url, json=payload, headers=headers)
+        except self.httpx.HTTPError as e:
+            error = RequestError(e)
+            # Nothing reached the server when the connection could not be opened
+            error.resendable = isinstance(e, (self.httpx.ConnectError, self.httpx.ConnectTimeout))
+            raise error from e
+
+    def close(self):
+        self.session.close()
+
+
+def create_transport(name, pool_size=10, connect_timeout=10, read_timeout=30):
+    """
+    Return the transport registered under the given name
+    """
+    if name == 'httpx':
+        transport = HttpxTransport
+    elif name == 'requests':
+        transport = RequestsTransport
+    else:
+        raise Exception(f'Unsupported HTTP transport {name}')
+    return transport(pool_size=pool_size, connect_timeout=connect_timeout, read_timeout=read_timeout)
+
+
+def backoff_delay(attempt, base=1.0, cap=60.0):
+    """
+    Return a full-jitter exponential backoff delay for the given retry attempt
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def retry_delay(error, attempt, description, max_retries=3, backoff_base=1.0, backoff_cap=60.0, resendable_only=False):
+    """
+    Return how long to wait before retrying a request after the given error
+    on the given attempt, or None when the error must be re-raised. Shared by
+    the synchronous and the asyncio clients.
+    """
+    if not error.transient or (resendable_only and not error.resendable) or attempt >= max_retries:
+        return None
+
+    delay = error.retry_after or backoff_delay(attempt, base=backoff_base, cap=backoff_cap)
+    logging.warning(f'{description} failed ({error}), retry {attempt + 1}/{max_retries} in {delay:.1f}s')
+    return delay
+
+
+def retry(action, description, errors=(RequestError,), max_retries=3, backoff_base=1.0, backoff_cap=60.0,
+          sleep=time.sleep, resendable_only=False):
+    """
+    Call action() until it succeeds, retrying transient errors of the given
+    types with jittered exponential backoff and re-raising everything else.
+    With resendable_only, only the errors the server certainly did not run
+    the request on are retried.
+    """
+    attempt = 0
+    while True:
+        try:
+            return action()
+        except errors as e:
+            delay = retry_delay(e, attempt, description, max_retries, backoff_base, backoff_cap, resendable_only)
+            if delay is None:
+                raise
+            attempt += 1
+            sleep(delay)
+
+
+def is_mutation(document):
+    """
+    Check whether the given GraphQL document is a mutation, which must not be
+    sent twice when the server may already have run it
+    """
+    return document.lstrip().startswith('mutation')
+
+
+def page_cursor(variables):
+    """
+    Return the pagination cursor a request is sent with, if any
+    """
+    variables = variables or {}
+    return variables.get('after') or variables.get('afterCursor')
+
+
+def response_error(response, data):
+    """
+    Return the error for a response with a non-2xx status, if any. Only server
+    errors and secondary rate limits are transient.
+    """
+    if 200 <= response.status_code < 300:
+        return None
+
+    message = str((data or {}).get('message', ''))
+    error = RequestError(f'HTTP {response.status_code}: {message}')
+    error.status = response.status_code
+
+    retry_after = response.headers.get('Retry-After')
+    if retry_after and retry_after.isdigit():
+        error.retry_after = int(retry_after)
+
+    if response.status_code in (403, 429):
+        # Only secondary rate limits resolve themselves, other refusals are final
+        error.transient = bool(error.retry_after) or 'secondary rate limit' in message.lower()
+        # A request refused with a wait to respect was not run
+        error.resendable = bool(error.retry_after)
+    elif response.status_code < 500:
+        # Bad credentials, a wrong endpoint or a malformed request fail the same way again
+        error.transient = False
+
+    return error
+
+
+class GraphQLClient:
+    """
+    Single entry point for every GraphQL query and mutation, sharing one
+    authenticated connection pool across the whole run
+    """
+
+    def __init__(self, endpoint, token, transport=None, pool_size=10, scheduler=None, metrics=None,
+                 max_retries=3, backoff_base=1.0, backoff_cap=60.0, sleep=time.sleep):
+        self.endpoint = endpoint
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.transport = transport or RequestsTransport(pool_size=pool_size)
+        self.scheduler = scheduler
+        self.metrics = metrics
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.sleep = sleep
+
+    def execute(self, query, variables=None):
+        """
+        Send the document with its variables and return the decoded response body,
+        retrying transport failures, server errors and secondary rate limits.
+        Mutations are only sent again when the server did not run them.
+        """
+        operation = operation_name(query)
+        with profiling.section(f'graphql {operation}'):
+            return self.retry(lambda: self._send(operation, query, variables), operation, resendable_only=is_mutation(query))
+
+    def retry(self, action, description, errors=(RequestError,), resendable_only=False):
+        """
+        Call action() under the retry policy of this client
+        """
+        return retry(
+            action,
+            description,
+            errors=errors,
+            max_retries=self.max_retries,
+            backoff_base=self.backoff_base,
+            backoff_cap=self.backoff_cap,
+            sleep=self.sleep,
+            resendable_only=resendable_only
+        )
+
+    def _send(self, operation, query, variables):
+        if self.scheduler:
+            self.scheduler.before_request(operation)
+
+        with tracing.span(operation, 'graphql', operation=operation, cursor=page_cursor(variables)) as span:
+            started_at = time.perf_counter()
+            response = self.transport.post(
+                self.endpoint,
+                {"query": query, "variables": variables or {}},
+                self.headers
+            )
+            span.update(status=response.status_code, response_size=len(response.content))
+        if self.metrics:
+            self.metrics.record_request(operation, time.perf_counter() - started_at, len(response.content))
+
+        try:
+            data = response.json()
+        except ValueError as e:
+            error = response_error(response, None)
+            if error is None:
+                error = RequestError(f'Invalid JSON response (HTTP {response.status_code})')
+                error.transient = False
+            raise error from e
+
+        error = response_error(response, data)
+        if error:
+            raise error
+
+        if self.scheduler:
+            cost = self.scheduler.record(operation, response.headers, data)
+            if self.metrics:
+                self.metrics.record_points(operation, cost)
+
+        return data
+
+    def close(self):
+        self.transport.close()
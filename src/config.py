@@ -1,28 +1,194 @@
 import os
 
-repository_owner = os.environ['GITHUB_REPOSITORY_OWNER']
-repository_owner_type = os.environ['INPUT_REPOSITORY_OWNER_TYPE']
-repository = os.environ['GITHUB_REPOSITORY']
-repository_name = repository.split('/')[1]
-server_url = os.environ['GITHUB_SERVER_URL']
-is_enterprise = True if os.environ.get('INPUT_ENTERPRISE_GITHUB') == 'True' else False
-dry_run = True if os.environ.get('INPUT_DRY_RUN') == 'True' else False
-
-gh_token = os.environ['INPUT_GH_TOKEN']
-project_number = int(os.environ['INPUT_PROJECT_NUMBER'])
-api_endpoint = os.environ.get('GITHUB_GRAPHQL_URL', 'https://github.intranet.unicaf.org/api/graphql')
-
-# Field names
-status_field_name = os.environ['INPUT_STATUS_FIELD_NAME']
-duedate_field_name = os.environ['INPUT_DUEDATE_FIELD_NAME']
-timespent_field_name = os.environ['INPUT_TIMESPENT_FIELD_NAME']
-release_field_name = os.environ['INPUT_RELEASE_FIELD_NAME']
-estimate_field_name = os.environ['INPUT_ESTIMATE_FIELD_NAME']
-priority_field_name = os.environ['INPUT_PRIORITY_FIELD_NAME']
-size_field_name = os.environ['INPUT_SIZE_FIELD_NAME']
-week_field_name = os.environ['INPUT_WEEK_FIELD_NAME']
-
-notification_type = os.environ['INPUT_NOTIFICATION_TYPE']
-
-if notification_type not in ['comment', 'email']:
-    raise Exception(f'Unsupported notification type {notification_type}')
+# Settings are read from the environment on first access, so importing a
+# module costs nothing until the run actually needs its configuration
+_loaded = False
+
+def parse_projects(value, default_owner, default_owner_type):
+    """
+    Parse a comma or newline separated list of projects written as
+    [owner_type:]owner/number, or just number for the repository owner
+    """
+    projects = []
+    for entry in value.replace('\n', ',').split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        owner_type = default_owner_type
+        if ':' in entry:
+            owner_type, entry = entry.split(':', 1)
+        owner, _, number = entry.rpartition('/')
+        projects.append({
+            'owner': owner or default_owner,
+            'owner_type': owner_type,
+            'project_number': int(number),
+        })
+    return projects
+
+def parse_repositories(value):
+    """
+    Parse a comma or newline separated list of owner/name repositories
+    """
+    repositories = []
+    for entry in value.replace('\n', ',').split(','):
+        entry = entry.strip()
+        if entry:
+            owner, name = entry.split('/', 1)
+            repositories.append({'owner': owner, 'repository': name})
+    return repositories
+
+def load():
+    """
+    Read and validate every setting from the environment
+    """
+    global _loaded
+
+    repository_owner = os.environ['GITHUB_REPOSITORY_OWNER']
+    repository_owner_type = os.environ['INPUT_REPOSITORY_OWNER_TYPE']
+    repository = os.environ['GITHUB_REPOSITORY']
+    repository_name = repository.split('/')[1]
+    server_url = os.environ['GITHUB_SERVER_URL']
+    is_enterprise = True if os.environ.get('INPUT_ENTERPRISE_GITHUB') == 'True' else False
+    dry_run = True if os.environ.get('INPUT_DRY_RUN') == 'True' else False
+
+    gh_token = os.environ['INPUT_GH_TOKEN']
+    project_number = int(os.environ['INPUT_PROJECT_NUMBER'])
+
+    # Every project and repository processed by one run, sharing the client, cache and rate limit budget
+    projects = parse_projects(
+        os.environ.get('INPUT_PROJECTS') or str(project_number),
+        repository_owner,
+        repository_owner_type
+    )
+    repositories = parse_repositories(os.environ.get('INPUT_REPOSITORIES') or repository)
+
+    api_endpoint = os.environ.get('GITHUB_GRAPHQL_URL', 'https://github.intranet.unicaf.org/api/graphql')
+
+    # HTTP connection settings shared by every GraphQL request
+    http_transport = os.environ.get('INPUT_HTTP_TRANSPORT') or 'requests'
+    pool_size = int(os.environ.get('INPUT_POOL_SIZE') or 10)
+    connect_timeout = float(os.environ.get('INPUT_CONNECT_TIMEOUT') or 10)
+    read_timeout = float(os.environ.get('INPUT_READ_TIMEOUT') or 30)
+    max_retries = int(os.environ.get('INPUT_MAX_RETRIES') or 3)
+
+    # Run mode: 'once' runs a single cycle, 'daemon' keeps polling with an adaptive interval,
+    # 'webhook' evaluates the items named by issues and projects_v2_item webhook events
+    run_mode = os.environ.get('INPUT_RUN_MODE') or 'once'
+    daemon_min_interval = int(os.environ.get('INPUT_DAEMON_MIN_INTERVAL') or 30)
+    daemon_max_interval = int(os.environ.get('INPUT_DAEMON_MAX_INTERVAL') or 600)
+    daemon_port = int(os.environ.get('INPUT_DAEMON_PORT') or 8080)
+
+    # Webhook receiver: the secret the deliveries are signed with and the port they arrive on
+    webhook_secret = os.environ.get('INPUT_WEBHOOK_SECRET', '')
+    webhook_port = int(os.environ.get('INPUT_WEBHOOK_PORT') or 8080)
+
+    # Execution engine: 'sync' runs every request in turn, 'async' overlaps comment checks and posts
+    execution_mode = os.environ.get('INPUT_EXECUTION_MODE') or 'sync'
+    max_in_flight = int(os.environ.get('INPUT_MAX_IN_FLIGHT') or 8)
+
+    # Number of issues whose comments are looked up in a single request
+    comment_batch_size = int(os.environ.get('INPUT_COMMENT_BATCH_SIZE') or 50)
+
+    # Number of comments posted in a single mutation, bounded by the content creation limits
+    comment_post_batch_size = max(1, min(int(os.environ.get('INPUT_COMMENT_POST_BATCH_SIZE') or 10), 80))
+
+    # Rate limit budget: points kept in reserve and the longest wait for a reset
+    rate_limit_reserve = int(os.environ.get('INPUT_RATE_LIMIT_RESERVE') or 100)
+    rate_limit_max_wait = int(os.environ.get('INPUT_RATE_LIMIT_MAX_WAIT') or 120)
+
+    # Field names
+    status_field_name = os.environ['INPUT_STATUS_FIELD_NAME']
+    duedate_field_name = os.environ['INPUT_DUEDATE_FIELD_NAME']
+    timespent_field_name = os.environ['INPUT_TIMESPENT_FIELD_NAME']
+    release_field_name = os.environ['INPUT_RELEASE_FIELD_NAME']
+    estimate_field_name = os.environ['INPUT_ESTIMATE_FIELD_NAME']
+    priority_field_name = os.environ['INPUT_PRIORITY_FIELD_NAME']
+    size_field_name = os.environ['INPUT_SIZE_FIELD_NAME']
+    week_field_name = os.environ['INPUT_WEEK_FIELD_NAME']
+
+    # Every field that must be set on a closed issue, fetched in a single project scan
+    required_field_names = [
+        status_field_name,
+        duedate_field_name,
+        timespent_field_name,
+        release_field_name,
+        estimate_field_name,
+        priority_field_name,
+        size_field_name,
+        week_field_name,
+    ]
+
+    notification_type = os.environ['INPUT_NOTIFICATION_TYPE']
+
+    # SMTP server the email digests are sent through, over a single connection per run
+    smtp_host = os.environ.get('INPUT_SMTP_HOST', '')
+    smtp_port = int(os.environ.get('INPUT_SMTP_PORT') or 587)
+    smtp_security = os.environ.get('INPUT_SMTP_SECURITY', 'starttls')
+    smtp_username = os.environ.get('INPUT_SMTP_USERNAME', '')
+    smtp_password = os.environ.get('INPUT_SMTP_PASSWORD', '')
+    smtp_sender = os.environ.get('INPUT_SMTP_SENDER', '')
+
+    # Ledger of notified issues, kept between runs with the Actions cache (empty to disable)
+    ledger_path = os.environ.get('INPUT_LEDGER_PATH', '.missing-fields/ledger.sqlite')
+    ledger_ttl_hours = float(os.environ.get('INPUT_LEDGER_TTL_HOURS') or 0)
+
+    # How existing notices are detected: 'tail' reads the newest comments first and only
+    # the bodies of the ones the token's own account wrote, 'full' reads every comment
+    comment_scan = os.environ.get('INPUT_COMMENT_SCAN', 'tail')
+
+    # Let the server select the closed issues instead of downloading every project item
+    server_side_filter = os.environ.get('INPUT_SERVER_SIDE_FILTER', 'True') == 'True'
+
+    # Local replica of the project items synced incrementally between runs (empty to disable)
+    replica_path = os.environ.get('INPUT_REPLICA_PATH', '')
+    replica_full_sync_hours = float(os.environ.get('INPUT_REPLICA_FULL_SYNC_HOURS') or 24)
+
+    # Directory the metrics.json and metrics.prom reports of each run are written to (empty to disable)
+    metrics_path = os.environ.get('INPUT_METRICS_PATH', '.missing-fields/metrics')
+    # Directory the CPU and memory profile of the run is written to (empty to disable)
+    profile_path = os.environ.get('INPUT_PROFILE_PATH', '')
+    # File the Chrome trace of the run is written to (empty to disable)
+    trace_path = os.environ.get('INPUT_TRACE_PATH', '')
+    # Job summary the metrics tables are appended to, set by GitHub Actions
+    step_summary_path = os.environ.get('GITHUB_STEP_SUMMARY', '')
+
+    if notification_type not in ['comment', 'email']:
+        raise Exception(f'Unsupported notification type {notification_type}')
+
+    if notification_type == 'email' and not (smtp_host and smtp_sender):
+        raise Exception('An SMTP host and sender are required to send email notifications')
+    if notification_type == 'email' and not ledger_path:
+        # Sent emails leave no trace to look for, the ledger is the only record of them
+        raise Exception('A ledger path is required to send email notifications')
+
+    if smtp_security not in ['starttls', 'ssl', 'none']:
+        raise Exception(f'Unsupported SMTP security {smtp_security}')
+
+    if run_mode not in ['once', 'daemon', 'webhook']:
+        raise Exception(f'Unsupported run mode {run_mode}')
+
+    if run_mode == 'webhook' and not webhook_secret:
+        raise Exception('A webhook secret is required to verify the webhook deliveries')
+
+    if comment_scan not in ['tail', 'full']:
+        raise Exception(f'Unsupported comment scan {comment_scan}')
+
+    if execution_mode not in ['sync', 'async']:
+        raise Exception(f'Unsupported execution mode {execution_mode}')
+
+    if http_transport not in ['requests', 'httpx']:
+        raise Exception(f'Unsupported HTTP transport {http_transport}')
+
+    globals().update(locals())
+    _loaded = True
+
+def __getattr__(name):
+    # Introspection, e.g. hasattr(config, '__wrapped__'), must not need the environment
+    if not _loaded and not (name.startswith('__') and name.endswith('__')):
+        try:
+            load()
+        except KeyError as e:
+            raise AttributeError(f"module 'config' has no attribute '{name}', {e.args[0]} is not set") from e
+        if name in globals():
+            return globals()[name]
+    raise AttributeError(f"module 'config' has no attribute '{name}'")
@@ -0,0 +1,142 @@
+import smtplib
+from email.message import EmailMessage
+from email.utils import formatdate, make_msgid
+from logger import logger
+import utils
+
+# Failures that only concern one message; the connection stays usable for the next ones
+MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+
+class Digest:
+    """
+    The flagged issues of one assignee, sent as a single email
+    """
+
+    def __init__(self, login, address):
+        self.login = login
+        self.address = address
+        self.entries = []
+
+
+def group_by_assignee(pending):
+    """
+    Group (issue, missing_fields, fingerprint) entries into one Digest per
+    assignee address. Return the digests keyed by lowercased address, and the
+    issues none of whose assignees has an email address.
+    """
+    digests = {}
+    unreachable = []
+    for entry in pending:
+        issue = entry[0]
+        recipients = [(login, address) for login, address in zip(issue.assignees, issue.assignee_emails) if address]
+        if not recipients:
+            unreachable.append(issue)
+            continue
+        for login, address in recipients:
+            digests.setdefault(address.lower(), Digest(login, address)).entries.append(entry)
+    return digests, unreachable
+
+
+def render(digest, sender):
+    """
+    Build the plain text email listing every issue of the digest with its missing fields
+    """
+    count = len(digest.entries)
+    message = EmailMessage()
+    message['Subject'] = f"{count} closed issue{'' if count == 1 else 's'} missing required project fields"
+    message['From'] = sender
+    message['To'] = digest.address
+    message['Date'] = formatdate()
+    message['Message-ID'] = make_msgid()
+
+    lines = [f'Hi @{digest.login},', '', 'These closed issues assigned to you are missing required project fields:', '']
+    for issue, missing_fields, _ in digest.entries:
+        lines.append(f'- #{issue.number} {issue.title}')
+        if issue.url:
+            lines.append(f'  {issue.url}')
+        lines.append(f'  {utils.missing_fields_notice(missing_fields)}')
+    message.set_content('\n'.join(lines) + '\n')
+    return message
+
+
+class SmtpSender:
+    """
+    Send messages over a single SMTP connection, opened on the first message
+    and reused for every following one, so the handshake, TLS negotiation and
+    authentication only happen once per run
+    """
+
+    def __init__(self, host, port, security='starttls', username='', password='', timeout=30):
+        self.host = host
+        self.port = port
+        self.security = security
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.connection = None
+
+    def connect(self):
+        if self.security == 'ssl':
+            connection = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.security == 'starttls':
+                connection.starttls()
+        if self.username:
+            connection.login(self.username, self.password)
+        return connection
+
+    def send(self, message):
+        """
+        Send the message, reconnecting once when the server dropped the connection
+        """
+        if self.connection is None:
+            self.connection = self.connect()
+        try:
+            self.connection.send_message(message)
+        except smtplib.SMTPServerDisconnected:
+            self.connection = self.connect()
+            self.connection.send_message(message)
+
+    def close(self):
+        if self.connection is None:
+            return
+        try:
+            self.connection.quit()
+        except (smtplib.SMTPException, OSError):
+            self.connection.close()
+        self.connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def send_digests(digests, sender, from_address, dry_run=False):
+    """
+    Send every digest through the sender and return the lowercased addresses
+    they were delivered to. A refused message is logged and skipped, a lost
+    connection ends the delivery.
+    """
+    delivered = set()
+    for address, digest in digests.items():
+        if dry_run:
+            logger.info(f'Digest of {len(digest.entries)} issues sent to @{digest.login}')
+            delivered.add(address)
+            continue
+
+        try:
+            sender.send(render(digest, from_address))
+        except MESSAGE_ERRORS as e:
+            logger.error(f'Failed to send the digest of @{digest.login}: {e}')
+            continue
+        except (smtplib.SMTPException, OSError) as e:
+            logger.error(f'Stopped sending digests, the SMTP connection failed: {e}')
+            break
+
+        delivered.add(address)
+        logger.info(f'Digest of {len(digest.entries)} issues sent to @{digest.login}')
+    return delivered
@@ -1,1007 +1,587 @@
-from pprint import pprint
-import requests
 import logging
 import config
-import utils
-
-def get_repo_closed_issues(owner, repository, after=None, issues=None):
-    query = """
-    query GetRepoClosedIssues($owner: String!, $repo: String!, $after: String) {
-          repository(owner: $owner, name: $repo) {
-            issues(first: 100, after: $after, states: [CLOSED]) {
-              nodes {
-                id
-                title
-                number
-                url
-                assignees(first:100) {
-                  nodes {
-                    name
-                    email
-                    login
-                  }
-                }
-                projectItems(first: 10) {
-                  nodes {
-                    project {
-                      number
-                      title
-                    }
-                  }
-                }
-              }
-              pageInfo {
-                endCursor
-                hasNextPage
-                hasPreviousPage
-              }
-              totalCount
-            }
-          }
-        }
+import queries
+from client import GraphQLClient, GraphQLError, RequestError, create_transport
+from ratelimit import RateLimitScheduler
+from metrics import get_metrics
+from models import IssueRef, ProjectItem
+import tracing
+
+# GitHub accepts at most 100 ids per nodes() lookup and 500,000 nodes per query
+MAX_NODE_IDS = 100
+MAX_QUERY_NODES = 500000
+
+# Number of projects whose first pages are packed into one aliased request
+PROJECTS_PER_REQUEST = 10
+
+_client = None
+
+def get_client():
     """
+    Return the GraphQL client shared by every query and mutation of the run
+    """
+    global _client
+    if _client is None:
+        _client = GraphQLClient(
+            config.api_endpoint,
+            config.gh_token,
+            transport=create_transport(
+                config.http_transport,
+                pool_size=config.pool_size,
+                connect_timeout=config.connect_timeout,
+                read_timeout=config.read_timeout
+            ),
+            scheduler=RateLimitScheduler(
+                reserve=config.rate_limit_reserve,
+                max_wait=config.rate_limit_max_wait
+            ),
+            metrics=get_metrics(),
+            max_retries=config.max_retries
+        )
+    return _client
 
-    variables = {
-        'owner': owner,
-        'repo': repository,
-        'after': after
-    }
+def set_client(client):
+    """
+    Replace the shared GraphQL client, e.g. to plug in a different transport
+    """
+    global _client
+    _client = client
 
-    response = requests.post(
-        config.api_endpoint,
-        json={"query": query, "variables": variables},
-        headers={"Authorization": f"Bearer {config.gh_token}"}
-    )
+def plan_pages(operation, total_count, page_size=100):
+    """
+    Tell the rate limit scheduler how many more pages the scan that just
+    fetched its first page is going to request
+    """
+    scheduler = get_client().scheduler
+    if scheduler:
+        scheduler.plan(operation, -(-total_count // page_size) - 1)
 
-    data = response.json()
+def paginate(fetch_page, strict=False, operation='Page'):
+    """
+    Yield the nodes of every page returned by fetch_page(after), following the
+    end cursor iteratively so memory and stack use stay flat.
 
+    A page that keeps failing ends the scan without discarding the pages already
+    yielded, or raises when strict is set and a partial result is not usable.
+    A request the server refused for good raises either way, so a revoked
+    token does not pass for an empty board.
+    """
+    after = None
+    while True:
+        try:
+            with tracing.span('page', 'pagination', operation=operation, cursor=after) as span:
+                nodes, pageinfo = get_client().retry(lambda: fetch_page(after), 'Page fetch', errors=(GraphQLError,))
+                span['items'] = len(nodes)
+        except RequestError as e:
+            if strict or e.refused:
+                raise
+            logging.error(f"Stopped paging at cursor {after}: {e}")
+            return
+
+        get_metrics().record_page(operation)
+        yield from nodes
+
+        if not pageinfo.get('hasNextPage'):
+            return
+
+        # Set the cursor for the next page
+        after = pageinfo.get('endCursor')
+
+def checked(data):
+    """
+    Return the response body, raising GraphQLError when it carries errors
+    """
     if data.get('errors'):
-        print(data.get('errors'))
-   
-    # Add debug print statement
-    pprint(data)
-
-    repository_data = data.get('data', {}).get('repository', {})
-    issues_data = repository_data.get('issues', {})
-    pageinfo = issues_data.get('pageInfo', {})
-    nodes = issues_data.get('nodes', [])
-
-    if issues is None:
-        issues = []
-    issues = issues + nodes
-    if pageinfo.get('hasNextPage'):
-        return get_repo_issues(
-            owner=owner,
-            repository=repository,
-            after=pageinfo.get('endCursor'),
-            issues=issues,
-            status_field_name=status_field_name
-        )
+        raise GraphQLError(data['errors'])
+    return data
+
+def get_repo_closed_issues(owner, repository):
+
+    def fetch_page(after):
+        variables = {
+            'owner': owner,
+            'repo': repository,
+            'after': after
+        }
+
+        data = get_client().execute(queries.repo_closed_issues_document(), variables)
+
+        if data.get('errors'):
+            raise GraphQLError(data['errors'])
 
-    return issues
-
-def get_project_issues_status(owner, owner_type, project_number, status_field_name, filters=None, after=None, issues=None):
-    query = f"""
-    query GetProjectIssues($owner: String!, $projectNumber: Int!, $status: String!, $after: String)  {{
-          {owner_type}(login: $owner) {{
-            projectV2(number: $projectNumber) {{
-              id
-              title
-              number
-              items(first: 100,after: $after) {{
-                nodes {{
-                  id
-                  fieldValueByName(name: $status) {{
-                    ... on ProjectV2ItemFieldSingleSelectValue {{
-                      id
-                      name
-                    }}
-                  }}
-                  content {{
-                    ... on Issue {{
-                      id
-                      title
-                      number
-                      state
-                      url
-                      assignees(first:20) {{
-                        nodes {{
-                          name
-                          email
-                          login
-                        }}
-                      }}
-                    }}
-                  }}
-                }}
-                pageInfo {{
-                endCursor
-                hasNextPage
-                hasPreviousPage
-              }}
-              totalCount
-              }}
-            }}
-          }}
-        }}
+        repository_data = data.get('data', {}).get('repository', {})
+        issues_data = repository_data.get('issues', {})
+        if after is None:
+            plan_pages('GetRepoClosedIssues', issues_data.get('totalCount', 0))
+        return [IssueRef.from_node(node) for node in issues_data.get('nodes', [])], issues_data.get('pageInfo', {})
+
+    return paginate(fetch_page, operation='GetRepoClosedIssues')
+
+def candidate_items_query(field_names):
+    """
+    Return the project filter selecting the closed issues that may miss a field.
+    The filter syntax cannot OR several no: qualifiers, so the missing field is
+    only pushed to the server when a single field is required.
     """
+    terms = ['is:issue', 'is:closed']
+    if len(field_names) == 1:
+        field_name = field_names[0]
+        terms.append(f'no:"{field_name}"' if ' ' in field_name else f'no:{field_name}')
+    return ' '.join(terms)
 
-    variables = {
-        'owner': owner,
-        'projectNumber': project_number,
-        'status': status_field_name,
-        'after': after
+def project_item_records(nodes, aliases, field_names, filters=None):
+    """
+    Turn the item nodes of a page into ProjectItem records
+    """
+    closed_only = filters and filters.get('closed_only')
+    return [
+        ProjectItem.from_node(node, aliases, field_names)
+        for node in nodes
+        if not closed_only or (node.get('content') or {}).get('state') == 'CLOSED'
+    ]
+
+def get_project_items(owner, owner_type, project_number, field_names, filters=None, query=None, strict=False, first_page=None):
+    """
+    Scan the project once and lazily yield one ProjectItem per item, listing
+    which of the requested fields have a value.
+    query narrows the scan with the project filter syntax, e.g. 'updated:>=2024-01-01'.
+    first_page is the items data of the first page when it was already fetched
+    with get_projects_first_pages.
+    """
+    aliases = queries.field_aliases(len(field_names))
+    document = queries.project_items_document(owner_type, len(field_names), bool(query))
+
+    def fetch_page(after):
+        if after is None and first_page is not None:
+            items_data = first_page
+        else:
+            variables = {
+                'owner': owner,
+                'projectNumber': project_number,
+                'after': after
+            }
+            variables.update(zip(aliases, field_names))
+            if query:
+                variables['query'] = query
+
+            data = get_client().execute(document, variables)
+
+            if 'errors' in data:
+                raise GraphQLError(data['errors'])
+
+            owner_data = data.get('data', {}).get(owner_type, {})
+            project_data = owner_data.get('projectV2', {})
+            items_data = project_data.get('items', {})
+
+        if after is None:
+            plan_pages('GetProjectItems', items_data.get('totalCount', 0))
+
+        records = project_item_records(items_data.get('nodes', []), aliases, field_names, filters=filters)
+        return records, items_data.get('pageInfo', {})
+
+    return paginate(fetch_page, strict=strict, operation='GetProjectItems')
+
+def item_project(node):
+    """
+    Return the owner and number of the project an item belongs to
+    """
+    project = node.get('project') or {}
+    return {
+        'owner': (project.get('owner') or {}).get('login'),
+        'project_number': project.get('number'),
     }
 
-    try:
-        response = requests.post(
-            config.api_endpoint,
-            json={"query": query, "variables": variables},
-            headers={"Authorization": f"Bearer {config.gh_token}"}
-        )
-    
-        data = response.json()
-    
-        if 'errors' in data:
-            logging.error(f"GraphQL query errors: {data['errors']}")
-            return []
-          
-        owner_data = data.get('data', {}).get(owner_type, {})
-        project_data = owner_data.get('projectV2', {})
-        items_data = project_data.get('items', {})
-        pageinfo = items_data.get('pageInfo', {})
-        nodes = items_data.get('nodes', [])
-    
-        if issues is None:
-            issues = []
-
-        if filters:
-            filtered_issues = []
-            for node in nodes:
-                if filters.get('closed_only') and node['content'].get('state') != 'CLOSED':
-                    continue
-                if filters.get('empty_status') and node['fieldValueByName']:
-                    continue
-                filtered_issues.append(node)
-    
-            nodes = filtered_issues
-    
-        issues = issues + nodes
-    
-        if pageinfo.get('hasNextPage'):
-            return get_project_issues_status(
-                owner=owner,
-                owner_type=owner_type,
-                project_number=project_number,
-                after=pageinfo.get('endCursor'),
-                filters=filters,
-                issues=issues,
-                status_field_name=status_field_name
-            )
-    
-        return issues
-    except requests.RequestException as e:
-        logging.error(f"Request error: {e}")
-        return []
+def get_project_item(item_id, field_names):
+    """
+    Return the record of a single project item, like the ones get_project_items
+    yields, with the owner and number of its project under record.project,
+    or None when the node is not a project item
+    """
+    aliases = queries.field_aliases(len(field_names))
+    variables = {'itemId': item_id}
+    variables.update(zip(aliases, field_names))
+
+    data = get_client().retry(
+        lambda: checked(get_client().execute(queries.project_item_document(len(field_names)), variables)),
+        'Item fetch',
+        errors=(GraphQLError,)
+    )
 
-def get_project_issues_duedate(owner, owner_type, project_number, duedate_field_name, filters=None, after=None, issues=None):
-    query = f"""
-    query GetProjectIssues($owner: String!, $projectNumber: Int!, $duedate: String!, $after: String)  {{
-          {owner_type}(login: $owner) {{
-            projectV2(number: $projectNumber) {{
-              id
-              title
-              number
-              items(first: 100,after: $after) {{
-                nodes {{
-                  id
-                  fieldValueByName(name: $duedate) {{
-                    ... on ProjectV2ItemFieldDateValue {{
-                      id
-                      date
-                    }}
-                  }}
-                  content {{
-                    ... on Issue {{
-                      id
-                      title
-                      number
-                      state
-                      url
-                      assignees(first:20) {{
-                        nodes {{
-                          name
-                          email
-                          login
-                        }}
-                      }}
-                    }}
-                  }}
-                }}
-                pageInfo {{
-                endCursor
-                hasNextPage
-                hasPreviousPage
-              }}
-              totalCount
-              }}
-            }}
-          }}
-        }}
+    node = (data.get('data') or {}).get('node')
+    if not node:
+        return None
+
+    record = ProjectItem.from_node(node, aliases, field_names)
+    record.project = item_project(node)
+    return record
+
+def get_issue(issue_id):
+    """
+    Return the IssueRef of a single issue, or None when the node is not an issue
     """
+    data = get_client().retry(
+        lambda: checked(get_client().execute(queries.issue_document(), {'issueId': issue_id})),
+        'Issue fetch',
+        errors=(GraphQLError,)
+    )
 
-    variables = {
-        'owner': owner,
-        'projectNumber': project_number,
-        'duedate': duedate_field_name,
-        'after': after
-    }
+    node = (data.get('data') or {}).get('node')
+    return IssueRef.from_node(node) if node else None
 
-    try:
-        response = requests.post(
-            config.api_endpoint,
-            json={"query": query, "variables": variables},
-            headers={"Authorization": f"Bearer {config.gh_token}"}
-        )
-    
-        data = response.json()
-    
-        if 'errors' in data:
-            logging.error(f"GraphQL query errors: {data['errors']}")
-            return []
-          
-        owner_data = data.get('data', {}).get(owner_type, {})
-        project_data = owner_data.get('projectV2', {})
-        items_data = project_data.get('items', {})
-        pageinfo = items_data.get('pageInfo', {})
-        nodes = items_data.get('nodes', [])
-    
-        if issues is None:
-            issues = []
-
-        if filters:
-            filtered_issues = []
-            for node in nodes:
-                if filters.get('closed_only') and node['content'].get('state') != 'CLOSED':
-                    continue
-                if filters.get('empty_duedate') and node['fieldValueByName']:
-                    continue
-                filtered_issues.append(node)
-    
-            nodes = filtered_issues
-    
-        issues = issues + nodes
-    
-        if pageinfo.get('hasNextPage'):
-            return get_project_issues_duedate(
-                owner=owner,
-                owner_type=owner_type,
-                project_number=project_number,
-                after=pageinfo.get('endCursor'),
-                filters=filters,
-                issues=issues,
-                duedate_field_name=duedate_field_name
-            )
-    
-        return issues
-    except requests.RequestException as e:
-        logging.error(f"Request error: {e}")
+def get_issue_project_items(issue_id, field_names):
+    """
+    Return the record of every project item of the given issue, each with the
+    owner and number of its project under record.project
+    """
+    aliases = queries.field_aliases(len(field_names))
+    variables = {'issueId': issue_id}
+    variables.update(zip(aliases, field_names))
+
+    data = get_client().retry(
+        lambda: checked(get_client().execute(queries.issue_project_items_document(len(field_names)), variables)),
+        'Issue items fetch',
+        errors=(GraphQLError,)
+    )
+
+    issue = (data.get('data') or {}).get('node')
+    if not issue:
         return []
 
-def get_project_issues_estimate(owner, owner_type, project_number, estimate_field_name, filters=None, after=None, issues=None):
-    query = f"""
-    query GetProjectIssues($owner: String!, $projectNumber: Int!, $estimate: String!, $after: String)  {{
-          {owner_type}(login: $owner) {{
-            projectV2(number: $projectNumber) {{
-              id
-              title
-              number
-              items(first: 100,after: $after) {{
-                nodes {{
-                  id
-                  fieldValueByName(name: $estimate) {{
-                    ... on ProjectV2ItemFieldSingleSelectValue {{
-                      id
-                      name
-                    }}
-                  }}
-                  content {{
-                    ... on Issue {{
-                      id
-                      title
-                      number
-                      state
-                      url
-                      assignees(first:20) {{
-                        nodes {{
-                          name
-                          email
-                          login
-                        }}
-                      }}
-                    }}
-                  }}
-                }}
-                pageInfo {{
-                endCursor
-                hasNextPage
-                hasPreviousPage
-              }}
-              totalCount
-              }}
-            }}
-          }}
-        }}
+    records = []
+    issue_ref = IssueRef.from_node(issue)
+    for node in issue.get('projectItems', {}).get('nodes', []):
+        record = ProjectItem.from_node(node, aliases, field_names, issue=issue_ref)
+        record.project = item_project(node)
+        records.append(record)
+    return records
+
+def get_projects_first_pages(projects, field_names):
     """
+    Fetch the first page of items of several projects with one aliased request
+    per PROJECTS_PER_REQUEST projects. Each project is a dict with owner,
+    owner_type, project_number and an optional project filter query.
+    Return the items data of each project's first page, or None for the
+    projects the server could not resolve.
+    """
+    aliases = queries.field_aliases(len(field_names))
+    pages = []
+
+    for start in range(0, len(projects), PROJECTS_PER_REQUEST):
+        chunk = projects[start:start + PROJECTS_PER_REQUEST]
+        document = queries.projects_first_pages_document(
+            len(field_names),
+            tuple((project['owner_type'], bool(project.get('query'))) for project in chunk)
+        )
 
-    variables = {
-        'owner': owner,
-        'projectNumber': project_number,
-        'estimate': estimate_field_name,
-        'after': after
-    }
+        variables = dict(zip(aliases, field_names))
+        for index, project in enumerate(chunk):
+            variables[f'owner{index}'] = project['owner']
+            variables[f'number{index}'] = project['project_number']
+            if project.get('query'):
+                variables[f'query{index}'] = project['query']
 
-    try:
-        response = requests.post(
-            config.api_endpoint,
-            json={"query": query, "variables": variables},
-            headers={"Authorization": f"Bearer {config.gh_token}"}
-        )
-    
-        data = response.json()
-    
-        if 'errors' in data:
-            logging.error(f"GraphQL query errors: {data['errors']}")
-            return []
-          
-        owner_data = data.get('data', {}).get(owner_type, {})
-        project_data = owner_data.get('projectV2', {})
-        items_data = project_data.get('items', {})
-        pageinfo = items_data.get('pageInfo', {})
-        nodes = items_data.get('nodes', [])
-    
-        if issues is None:
-            issues = []
-
-        if filters:
-            filtered_issues = []
-            for node in nodes:
-                if filters.get('closed_only') and node['content'].get('state') != 'CLOSED':
-                    continue
-                if filters.get('empty_estimate') and node['fieldValueByName']:
-                    continue
-                filtered_issues.append(node)
-    
-            nodes = filtered_issues
-    
-        issues = issues + nodes
-    
-        if pageinfo.get('hasNextPage'):
-            return get_project_issues_estimate(
-                owner=owner,
-                owner_type=owner_type,
-                project_number=project_number,
-                after=pageinfo.get('endCursor'),
-                filters=filters,
-                issues=issues,
-                estimate_field_name=estimate_field_name
-            )
-    
-        return issues
-    except requests.RequestException as e:
-        logging.error(f"Request error: {e}")
-        return []
+        data = get_client().execute(document, variables)
+
+        # One unresolvable project only fails its own alias
+        failed = {(error.get('path') or [None])[0] for error in data.get('errors') or []}
+        if None in failed:
+            raise GraphQLError(data['errors'])
 
-def get_project_issues_release(owner, owner_type, project_number, release_field_name, filters=None, after=None, issues=None):
-    query = f"""
-    query GetProjectIssues($owner: String!, $projectNumber: Int!, $release: String!, $after: String)  {{
-          {owner_type}(login: $owner) {{
-            projectV2(number: $projectNumber) {{
-              id
-              title
-              number
-              items(first: 100,after: $after) {{
-                nodes {{
-                  id
-                  fieldValueByName(name: $release) {{
-                    ... on ProjectV2ItemFieldSingleSelectValue {{
-                      id
-                      name
-                    }}
-                  }}
-                  content {{
-                    ... on Issue {{
-                      id
-                      title
-                      number
-                      state
-                      url
-                      assignees(first:20) {{
-                        nodes {{
-                          name
-                          email
-                          login
-                        }}
-                      }}
-                    }}
-                  }}
-                }}
-                pageInfo {{
-                endCursor
-                hasNextPage
-                hasPreviousPage
-              }}
-              totalCount
-              }}
-            }}
-          }}
-        }}
+        for index in range(len(chunk)):
+            owner_data = (data.get('data') or {}).get(f'project{index}')
+            project_data = (owner_data or {}).get('projectV2')
+            if f'project{index}' in failed or not project_data:
+                pages.append(None)
+            else:
+                pages.append(project_data.get('items', {}))
+
+    return pages
+
+def add_issue_comments_request(comments):
+    """
+    Build the aliased addComment mutation for the given (issue_id, body) pairs
+    and return it with its variables and aliases
     """
+    aliases = [f'comment{index}' for index in range(len(comments))]
+    mutation = queries.add_issue_comments_document(len(comments))
 
-    variables = {
-        'owner': owner,
-        'projectNumber': project_number,
-        'release': release_field_name,
-        'after': after
-    }
+    variables = {}
+    for index, (issue_id, body) in enumerate(comments):
+        variables[f'subject{index}'] = issue_id
+        variables[f'body{index}'] = body
 
-    try:
-        response = requests.post(
-            config.api_endpoint,
-            json={"query": query, "variables": variables},
-            headers={"Authorization": f"Bearer {config.gh_token}"}
-        )
-    
-        data = response.json()
-    
-        if 'errors' in data:
-            logging.error(f"GraphQL query errors: {data['errors']}")
-            return []
-          
-        owner_data = data.get('data', {}).get(owner_type, {})
-        project_data = owner_data.get('projectV2', {})
-        items_data = project_data.get('items', {})
-        pageinfo = items_data.get('pageInfo', {})
-        nodes = items_data.get('nodes', [])
-    
-        if issues is None:
-            issues = []
-    
-        if filters:
-            filtered_issues = []
-            for node in nodes:
-                if filters.get('closed_only') and node['content'].get('state') != 'CLOSED':
-                    continue
-                if filters.get('empty_release') and node['fieldValueByName']:
-                    continue
-                filtered_issues.append(node)
-    
-            nodes = filtered_issues
-    
-        issues = issues + nodes
-
-        if pageinfo.get('hasNextPage'):
-            return get_project_issues_release(
-                owner=owner,
-                owner_type=owner_type,
-                project_number=project_number,
-                after=pageinfo.get('endCursor'),
-                filters=filters,
-                issues=issues,
-                release_field_name=release_field_name
-            )
-            
-        return issues
-    except requests.RequestException as e:
-        logging.error(f"Request error: {e}")
-        return []
+    return mutation, variables, aliases
 
-def get_project_issues_priority(owner, owner_type, project_number, priority_field_name, filters=None, after=None, issues=None):
-    query = f"""
-    query GetProjectIssues($owner: String!, $projectNumber: Int!, $priority: String!, $after: String)  {{
-          {owner_type}(login: $owner) {{
-            projectV2(number: $projectNumber) {{
-              id
-              title
-              number
-              items(first: 100,after: $after) {{
-                nodes {{
-                  id
-                  fieldValueByName(name: $priority) {{
-                    ... on ProjectV2ItemFieldSingleSelectValue {{
-                      id
-                      name
-                    }}
-                  }}
-                  content {{
-                    ... on Issue {{
-                      id
-                      title
-                      number
-                      state
-                      url
-                      assignees(first:20) {{
-                        nodes {{
-                          name
-                          email
-                          login
-                        }}
-                      }}
-                    }}
-                  }}
-                }}
-                pageInfo {{
-                endCursor
-                hasNextPage
-                hasPreviousPage
-              }}
-              totalCount
-              }}
-            }}
-          }}
-        }}
+def update_issue_comments_request(comments):
+    """
+    Build the aliased updateIssueComment mutation for the given (comment_id, body)
+    pairs and return it with its variables and aliases
     """
+    aliases = [f'comment{index}' for index in range(len(comments))]
+    mutation = queries.update_issue_comments_document(len(comments))
 
-    variables = {
-        'owner': owner,
-        'projectNumber': project_number,
-        'priority': priority_field_name,
-        'after': after
+    variables = {}
+    for index, (comment_id, body) in enumerate(comments):
+        variables[f'comment{index}'] = comment_id
+        variables[f'body{index}'] = body
+
+    return mutation, variables, aliases
+
+def add_issue_comments_results(data, aliases, comments):
+    """
+    Return whether each issue got its comment from an aliased addComment or
+    updateIssueComment response, keyed by the first entry of each pair
+    """
+    failed = set()
+    for error in data.get('errors') or []:
+        logging.error(f"GraphQL mutation errors: {error}")
+        failed.update(error.get('path') or aliases)
+
+    results = data.get('data') or {}
+    return {
+        issue_id: alias not in failed and results.get(alias) is not None
+        for alias, (issue_id, _) in zip(aliases, comments)
     }
 
-    try:
-        response = requests.post(
-            config.api_endpoint,
-            json={"query": query, "variables": variables},
-            headers={"Authorization": f"Bearer {config.gh_token}"}
-        )
-    
-        data = response.json()
-    
-        if 'errors' in data:
-            logging.error(f"GraphQL query errors: {data['errors']}")
-            return []
-          
-        owner_data = data.get('data', {}).get(owner_type, {})
-        project_data = owner_data.get('projectV2', {})
-        items_data = project_data.get('items', {})
-        pageinfo = items_data.get('pageInfo', {})
-        nodes = items_data.get('nodes', [])
-    
-        if issues is None:
-            issues = []
-        if filters:
-            filtered_issues = []
-            for node in nodes:
-                if filters.get('closed_only') and node['content'].get('state') != 'CLOSED':
-                    continue
-                if filters.get('empty_priority') and node['fieldValueByName']:
-                    continue
-                filtered_issues.append(node)
-    
-            nodes = filtered_issues
-    
-        issues = issues + nodes
-    
-        if pageinfo.get('hasNextPage'):
-            return get_project_issues_priority(
-                owner=owner,
-                owner_type=owner_type,
-                project_number=project_number,
-                after=pageinfo.get('endCursor'),
-                filters=filters,
-                issues=issues,
-                priority_field_name=priority_field_name
-            )
-    
-        return issues
-    except requests.RequestException as e:
-        logging.error(f"Request error: {e}")
-        return
-       
-
-def get_project_issues_size(owner, owner_type, project_number, size_field_name, filters=None, after=None, issues=None):
-    query = f"""
-    query GetProjectIssues($owner: String!, $projectNumber: Int!, $size: String!, $after: String)  {{
-          {owner_type}(login: $owner) {{
-            projectV2(number: $projectNumber) {{
-              id
-              title
-              number
-              items(first: 100,after: $after) {{
-                nodes {{
-                  id
-                  fieldValueByName(name: $size) {{
-                    ... on ProjectV2ItemFieldSingleSelectValue {{
-                      id
-                      name
-                    }}
-                  }}
-                  content {{
-                    ... on Issue {{
-                      id
-                      title
-                      number
-                      state
-                      url
-                      assignees(first:20) {{
-                        nodes {{
-                          name
-                          email
-                          login
-                        }}
-                      }}
-                    }}
-                  }}
-                }}
-                pageInfo {{
-                endCursor
-                hasNextPage
-                hasPreviousPage
-              }}
-              totalCount
-              }}
-            }}
-          }}
-        }}
+def add_issue_comments(comments):
+    """
+    Add several comments in one request through aliased addComment mutations.
+    comments is a list of (issue_id, body) pairs; return whether each issue
+    got its comment, keyed by issue id
     """
+    mutation, variables, aliases = add_issue_comments_request(comments)
 
-    variables = {
-        'owner': owner,
-        'projectNumber': project_number,
-        'size': size_field_name,
-        'after': after
-    }
+    scheduler = get_client().scheduler
+    if scheduler:
+        scheduler.before_content(len(comments))
 
     try:
-        response = requests.post(
-            config.api_endpoint,
-            json={"query": query, "variables": variables},
-            headers={"Authorization": f"Bearer {config.gh_token}"}
-        )
-    
-        data = response.json()
-    
-        if 'errors' in data:
-            logging.error(f"GraphQL query errors: {data['errors']}")
-            return []
-          
-        owner_data = data.get('data', {}).get(owner_type, {})
-        project_data = owner_data.get('projectV2', {})
-        items_data = project_data.get('items', {})
-        pageinfo = items_data.get('pageInfo', {})
-        nodes = items_data.get('nodes', [])
-    
-        if issues is None:
-            issues = []
-
-        if filters:
-            filtered_issues = []
-            for node in nodes:
-                if filters.get('closed_only') and node['content'].get('state') != 'CLOSED':
-                    continue
-                if filters.get('empty_size') and node['fieldValueByName']:
-                    continue
-                filtered_issues.append(node)
-    
-            nodes = filtered_issues
-    
-        issues = issues + nodes
-    
-        if pageinfo.get('hasNextPage'):
-            return get_project_issues_size(
-                owner=owner,
-                owner_type=owner_type,
-                project_number=project_number,
-                after=pageinfo.get('endCursor'),
-                filters=filters,
-                issues=issues,
-                size_field_name=size_field_name
-            )
-    
-        return issues
-    except requests.RequestException as e:
+        data = get_client().execute(mutation, variables)
+    except RequestError as e:
         logging.error(f"Request error: {e}")
-        return
-
-def get_project_issues_week(owner, owner_type, project_number, week_field_name, filters=None, after=None, issues=None):
-    query = f"""
-    query GetProjectIssues($owner: String!, $projectNumber: Int!, $week: String!, $after: String)  {{
-          {owner_type}(login: $owner) {{
-            projectV2(number: $projectNumber) {{
-              id
-              title
-              number
-              items(first: 100,after: $after) {{
-                nodes {{
-                  id
-                  fieldValueByName(name: $week) {{
-                    ... on ProjectV2ItemFieldIterationValue {{
-                      title
-                    }}
-                  }}
-                  content {{
-                    ... on Issue {{
-                      id
-                      title
-                      number
-                      state
-                      url
-                      assignees(first:20) {{
-                        nodes {{
-                          name
-                          email
-                          login
-                        }}
-                      }}
-                    }}
-                  }}
-                }}
-                pageInfo {{
-                endCursor
-                hasNextPage
-                hasPreviousPage
-              }}
-              totalCount
-              }}
-            }}
-          }}
-        }}
+        return {issue_id: False for issue_id, _ in comments}
+
+    return add_issue_comments_results(data, aliases, comments)
+
+def update_issue_comments(comments):
+    """
+    Edit several comments in place in one request through aliased
+    updateIssueComment mutations. comments is a list of (comment_id, body)
+    pairs; return whether each comment was updated, keyed by comment id
     """
+    mutation, variables, aliases = update_issue_comments_request(comments)
 
-    variables = {
-        'owner': owner,
-        'projectNumber': project_number,
-        'week': week_field_name,
-        'after': after
-    }
+    scheduler = get_client().scheduler
+    if scheduler:
+        scheduler.before_content(len(comments))
 
     try:
-        response = requests.post(
-            config.api_endpoint,
-            json={"query": query, "variables": variables},
-            headers={"Authorization": f"Bearer {config.gh_token}"}
-        )
-    
-        data = response.json()
-    
-        if 'errors' in data:
-            logging.error(f"GraphQL query errors: {data['errors']}")
-            return []
-          
-        owner_data = data.get('data', {}).get(owner_type, {})
-        project_data = owner_data.get('projectV2', {})
-        items_data = project_data.get('items', {})
-        pageinfo = items_data.get('pageInfo', {})
-        nodes = items_data.get('nodes', [])
-    
-        if issues is None:
-            issues = []
-
-        if filters:
-            filtered_issues = []
-            for node in nodes:
-                if filters.get('closed_only') and node['content'].get('state') != 'CLOSED':
-                    continue
-                if filters.get('empty_week') and node['fieldValueByName']:
-                    continue
-                filtered_issues.append(node)
-    
-            nodes = filtered_issues
-    
-        issues = issues + nodes
-    
-        if pageinfo.get('hasNextPage'):
-            return get_project_issues_week(
-                owner=owner,
-                owner_type=owner_type,
-                project_number=project_number,
-                after=pageinfo.get('endCursor'),
-                filters=filters,
-                issues=issues,
-                week_field_name=week_field_name
-            )
-    
-        return issues
-    except requests.RequestException as e:
+        data = get_client().execute(mutation, variables)
+    except RequestError as e:
         logging.error(f"Request error: {e}")
-        return
-
-
-def get_project_issues_timespent(owner, owner_type, project_number, timespent_field_name, filters=None, after=None, issues=None):
-    query = f"""
-    query GetProjectIssues($owner: String!, $projectNumber: Int!, $timespent: String!, $after: String)  {{
-          {owner_type}(login: $owner) {{
-            projectV2(number: $projectNumber) {{
-              id
-              title
-              number
-              items(first: 100,after: $after) {{
-                nodes {{
-                  id
-                  fieldValueByName(name: $timespent) {{
-                    ... on ProjectV2ItemFieldSingleSelectValue {{
-                      id
-                      name
-                    }}
-                  }}
-                  content {{
-                    ... on Issue {{
-                      id
-                      title
-                      number
-                      state
-                      url
-                      assignees(first:20) {{
-                        nodes {{
-                          name
-                          email
-                          login
-                        }}
-                      }}
-                    }}
-                  }}
-                }}
-                pageInfo {{
-                endCursor
-                hasNextPage
-                hasPreviousPage
-              }}
-              totalCount
-              }}
-            }}
-          }}
-        }}
+        return {comment_id: False for comment_id, _ in comments}
+
+    return add_issue_comments_results(data, aliases, comments)
+
+def get_issue_comments(issue_id):
+    """
+    Lazily yield the comments of the given issue, oldest first
     """
 
-    variables = {
-        'owner': owner,
-        'projectNumber': project_number,
-        'timespent': timespent_field_name,
-        'after': after
-    }
+    def fetch_page(after):
+        variables = {
+            'issueId': issue_id,
+            'afterCursor': after
+        }
+
+        data = get_client().execute(queries.ISSUE_COMMENTS_QUERY, variables)
 
-    try:
-        response = requests.post(
-            config.api_endpoint,
-            json={"query": query, "variables": variables},
-            headers={"Authorization": f"Bearer {config.gh_token}"}
-        )
-    
-        data = response.json()
-    
         if 'errors' in data:
-            logging.error(f"GraphQL query errors: {data['errors']}")
-            return []
-          
-        owner_data = data.get('data', {}).get(owner_type, {})
-        project_data = owner_data.get('projectV2', {})
-        items_data = project_data.get('items', {})
-        pageinfo = items_data.get('pageInfo', {})
-        nodes = items_data.get('nodes', [])
-    
-        if issues is None:
-            issues = []
-
-        if filters:
-            filtered_issues = []
-            for node in nodes:
-                if filters.get('closed_only') and node['content'].get('state') != 'CLOSED':
-                    continue
-                if filters.get('empty_timespent') and node['fieldValueByName']:
-                    continue
-                filtered_issues.append(node)
-    
-            nodes = filtered_issues
-    
-        issues = issues + nodes
-    
-        if pageinfo.get('hasNextPage'):
-            return get_project_issues_timespent(
-                owner=owner,
-                owner_type=owner_type,
-                project_number=project_number,
-                after=pageinfo.get('endCursor'),
-                filters=filters,
-                issues=issues,
-                timespent_field_name=timespent_field_name
-            )
-    
-        return issues
-    except requests.RequestException as e:
-            logging.error(f"Request error: {e}")
-            return []
+            raise GraphQLError(data['errors'])
 
+        comments_data = data.get('data', {}).get('node', {}).get('comments', {})
+        return comments_data.get('nodes', []), comments_data.get('pageInfo', {})
 
+    return paginate(fetch_page, strict=True, operation='GetIssueComments')
 
-def add_issue_comment(issueId, comment):
-    mutation = """
-    mutation AddIssueComment($issueId: ID!, $comment: String!) {
-        addComment(input: {subjectId: $issueId, body: $comment}) {
-            clientMutationId
-        }
-    }
+def get_issues_recent_comments(issue_ids, last=100, query=queries.ISSUES_RECENT_COMMENTS_QUERY):
+    """
+    Fetch the most recent comments of several issues in one request and return
+    them keyed by issue id
     """
 
     variables = {
-        'issueId': issueId,
-        'comment': comment
+        'ids': issue_ids,
+        'last': last
     }
 
-    try:
-        response = requests.post(
-            config.api_endpoint,
-            json={"query": mutation, "variables": variables},
-            headers={"Authorization": f"Bearer {config.gh_token}"}
-        )
-        data = response.json()
+    data = get_client().execute(query, variables)
+    return recent_comments_result(data)
 
-        if 'errors' in data:
-            logging.error(f"GraphQL mutation errors: {data['errors']}")
+def batch_nodes(data):
+    """
+    Return the nodes of a nodes(ids:) response, None for every node an error was
+    reported on. An error on one node, e.g. an issue deleted since the scan, only
+    leaves that node out; the other errors fail the whole batch.
+    """
+    nodes = list((data.get('data') or {}).get('nodes') or [])
+    batch_errors = []
+    for error in data.get('errors') or []:
+        path = error.get('path') or []
+        if len(path) > 1 and path[0] == 'nodes' and isinstance(path[1], int) and path[1] < len(nodes):
+            logging.warning(f"Leaving out node {path[1]} of the batch: {error.get('message')}")
+            nodes[path[1]] = None
+        else:
+            batch_errors.append(error)
+
+    if batch_errors:
+        raise GraphQLError(batch_errors)
+    return nodes
+
+def recent_comments_result(data):
+    """
+    Return the comments of a GetIssuesRecentComments response keyed by issue
+    id. The issues whose comments could not be read are left out.
+    """
+    return {node['id']: node['comments'] for node in batch_nodes(data) if node}
 
-        return data.get('data')
+def comment_batch_limit(batch_size, last):
+    """
+    Cap the number of issues per comment batch by the GraphQL node limits
+    """
+    return max(1, min(batch_size, MAX_NODE_IDS, MAX_QUERY_NODES // max(1, last)))
 
-    except requests.RequestException as e:
-        logging.error(f"Request error: {e}")
-        return {}
+def is_batch_too_large(error):
+    """
+    Check whether a failed comment batch could succeed with fewer issues
+    """
+    node_limit = any(e.get('type') == 'MAX_NODE_LIMIT_EXCEEDED' for e in error.errors)
+    return node_limit or error.transient
 
-def get_issue_comments(issue_id):
-    query = """
-    query GetIssueComments($issueId: ID!, $afterCursor: String) {
-        node(id: $issueId) {
-            ... on Issue {
-                comments(first: 100, after: $afterCursor) {
-                    nodes {
-                        body
-                        createdAt
-                        author {
-                            login
-                        }
-                    }
-                    pageInfo {
-                        endCursor
-                        hasNextPage
-                    }
-                }
-            }
-        }
-    }
+def issue_comment_batches(issue_ids, batch_size=50, last=100, query=queries.ISSUES_RECENT_COMMENTS_QUERY):
     """
+    Yield (batch, comments keyed by issue id) for every batch of the given
+    issues, fetching the most recent comments of a whole batch per request.
 
-    variables = {
-        'issueId': issue_id,
-        'afterCursor': None
-    }
+    The batch size is capped by the GraphQL node limits and halved whenever a
+    batch is still too expensive for the server to resolve.
+    """
+    batch_size = comment_batch_limit(batch_size, last)
+
+    start = 0
+    while start < len(issue_ids):
+        batch = issue_ids[start:start + batch_size]
+        try:
+            comments_by_issue = get_client().retry(
+                lambda: get_issues_recent_comments(batch, last=last, query=query),
+                'Comment batch',
+                errors=(GraphQLError,)
+            )
+        except GraphQLError as e:
+            if batch_size == 1 or not is_batch_too_large(e):
+                raise
+            batch_size = max(1, batch_size // 2)
+            logging.warning(f"Comment batch too large, retrying with {batch_size} issues per request")
+            continue
 
-    all_comments = []
+        yield batch, comments_by_issue
+        start += len(batch)
 
-    try:
-        while True:
-            response = requests.post(
-                config.api_endpoint,
-                json={"query": query, "variables": variables},
-                headers={"Authorization": f"Bearer {config.gh_token}"}
-            )
+def get_issues_comments(issue_ids, batch_size=50, last=100):
+    """
+    Yield (issue_id, comments, complete) for every given issue whose comments
+    could be read, fetching the most recent comments of a whole batch of issues
+    per request. complete is False when the issue has older comments than the
+    ones returned.
+    """
+    for batch, comments_by_issue in issue_comment_batches(issue_ids, batch_size=batch_size, last=last):
+        for issue_id in batch:
+            if issue_id not in comments_by_issue:
+                continue
+            comments = comments_by_issue[issue_id] or {}
+            complete = not comments.get('pageInfo', {}).get('hasPreviousPage')
+            yield issue_id, comments.get('nodes', []), complete
+
+def own_comment_ids(comments):
+    """
+    Return the ids of the comments of a connection written by the token's own
+    account, newest first
+    """
+    return [comment['id'] for comment in reversed(comments.get('nodes') or []) if comment.get('viewerDidAuthor')]
 
-            data = response.json()
+def earlier_cursor(comments):
+    """
+    Return the cursor to read the comments older than a connection with, or
+    None when it starts at the first comment
+    """
+    pageinfo = comments.get('pageInfo') or {}
+    return pageinfo.get('startCursor') if pageinfo.get('hasPreviousPage') else None
 
-            if 'errors' in data:
-                logging.error(f"GraphQL query errors: {data['errors']}")
-                break
+def comment_bodies_result(data):
+    """
+    Return the comment bodies of a GetCommentBodies response keyed by comment id
+    """
+    return {node['id']: node.get('body') or '' for node in batch_nodes(data) if node}
 
-            comments_data = data.get('data', {}).get('node', {}).get('comments', {})
-            comments = comments_data.get('nodes', [])
-            all_comments.extend(comments)
+def get_comment_bodies(comment_ids):
+    """
+    Fetch the bodies of the given comments, MAX_NODE_IDS per request, keyed by comment id
+    """
+    bodies = {}
+    for start in range(0, len(comment_ids), MAX_NODE_IDS):
+        chunk = comment_ids[start:start + MAX_NODE_IDS]
+        bodies.update(get_client().retry(
+            lambda: comment_bodies_result(get_client().execute(queries.COMMENT_BODIES_QUERY, {'ids': chunk})),
+            'Comment bodies fetch',
+            errors=(GraphQLError,)
+        ))
+    return bodies
+
+def get_issues_own_comments(issue_ids, batch_size=50, last=100):
+    """
+    Yield (issue_id, comments, before) for every given issue whose comments
+    could be read. comments are the
+    issue's most recent comments written by the token's own account, newest
+    first; before is the cursor of its older comments, or None when there are none.
 
-            pageinfo = comments_data.get('pageInfo', {})
-            if not pageinfo.get('hasNextPage'):
-                break
+    Only the authorship of the recent comments is read for a whole batch of
+    issues, the bodies are then fetched for the own comments alone.
+    """
+    query = queries.ISSUES_RECENT_COMMENT_AUTHORS_QUERY
+    for batch, comments_by_issue in issue_comment_batches(issue_ids, batch_size=batch_size, last=last, query=query):
+        own_ids = {issue_id: own_comment_ids(comments or {}) for issue_id, comments in comments_by_issue.items()}
+        bodies = get_comment_bodies([comment_id for ids in own_ids.values() for comment_id in ids])
+
+        for issue_id in batch:
+            # A notice whose body could not be read would be posted again
+            if issue_id not in comments_by_issue or not bodies.keys() >= set(own_ids[issue_id]):
+                continue
+            comments = [{'id': comment_id, 'viewerDidAuthor': True, 'body': bodies.get(comment_id, '')} for comment_id in own_ids[issue_id]]
+            yield issue_id, comments, earlier_cursor(comments_by_issue[issue_id] or {})
+
+def get_issue_own_comments(issue_id, before):
+    """
+    Lazily yield the comments of the given issue written by the token's own
+    account from the before cursor back to the first comment, newest first
+    """
 
-            # Set the cursor for the next page
-            variables['afterCursor'] = pageinfo.get('endCursor')
+    def fetch_page(cursor):
+        variables = {
+            'issueId': issue_id,
+            'before': cursor or before
+        }
 
-        return all_comments
+        data = get_client().execute(queries.ISSUE_EARLIER_COMMENT_AUTHORS_QUERY, variables)
 
-    except requests.RequestException as e:
-        logging.error(f"Request error: {e}")
-        return []
+        if 'errors' in data:
+            raise GraphQLError(data['errors'])
+
+        comments_data = data.get('data', {}).get('node', {}).get('comments', {})
+        own_ids = own_comment_ids(comments_data)
+        bodies = get_comment_bodies(own_ids) if own_ids else {}
+
+        # paginate follows the next page, which is the earlier one when reading backwards
+        pageinfo = {'hasNextPage': earlier_cursor(comments_data) is not None, 'endCursor': earlier_cursor(comments_data)}
+        return [{'id': comment_id, 'viewerDidAuthor': True, 'body': bodies.get(comment_id, '')} for comment_id in own_ids], pageinfo
+
+    return paginate(fetch_page, strict=True, operation='GetIssueEarlierCommentAuthors')
@@ -0,0 +1,60 @@
+import os
+import sqlite3
+import time
+
+
+class NotificationLedger:
+    """
+    Persistent record of the issues that have already been notified and for
+    which set of missing fields, so their comments do not need re-reading
+    """
+
+    def __init__(self, path, ttl_hours=0, clock=time.time):
+        self.path = path
+        self.ttl = ttl_hours * 3600
+        self.clock = clock
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # The asyncio engine reads the store from its scan thread as well
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS notified (
+                issue_id TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                notified_at REAL NOT NULL
+            )
+            """
+        )
+        self.connection.commit()
+
+    def is_notified(self, issue_id, fingerprint):
+        """
+        Check if the issue was notified for the same missing fields and the entry is still fresh
+        """
+        row = self.connection.execute(
+            'SELECT fingerprint, notified_at FROM notified WHERE issue_id = ?',
+            (issue_id,)
+        ).fetchone()
+
+        if row is None or row[0] != fingerprint:
+            return False
+        if self.ttl and self.clock() - row[1] > self.ttl:
+            return False
+        return True
+
+    def record(self, issue_id, fingerprint):
+        """
+        Remember that the issue has been notified for the given missing fields
+        """
+        self.connection.execute(
+            'INSERT OR REPLACE INTO notified (issue_id, fingerprint, notified_at) VALUES (?, ?, ?)',
+            (issue_id, fingerprint, self.clock())
+        )
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
@@ -1,376 +1,612 @@
 from logger import logger
-import requests
+import itertools
 import config
 import utils
 import graphql
-
-def notify_missing_status():
+import queries
+from ledger import NotificationLedger
+from replica import ProjectReplica
+from client import GraphQLError, RequestError
+from ratelimit import RateLimitExceeded
+from collections import Counter
+from models import ProjectItem
+from metrics import get_metrics
+import metrics
+import profiling
+import tracing
+
+# Counters of the current run: evaluated, changed and flagged issues, issues checked for a notice and comments added
+run_stats = Counter()
+
+# Latest updatedAt of the closed items and issues seen by the previous runs of the process
+last_updated_at = None
+
+# Cleared for the life of the process once the server rejects a project item filter
+filters_supported = True
+
+def project_scope(project):
+    """
+    Return the key identifying the project, e.g. 'owner/1'
+    """
+    return f"{project['owner']}/{project['project_number']}"
+
+def get_project_items(replica=None):
+    """
+    Scan every configured project once and lazily yield a ProjectItem for
+    every closed item, listing its required fields that have a value. With a
+    replica only the items changed since the previous run are fetched.
+    """
     if config.is_enterprise:
-        issues = graphql.get_project_issues_status(
-            owner=config.repository_owner,
-            owner_type=config.repository_owner_type,
-            project_number=config.project_number,
-            status_field_name=config.status_field_name,
-            filters={'empty_status': True, 'closed_only': True}
+        projects = [dict(project, query=project_query(project, replica)) for project in config.projects]
+        first_pages = get_first_pages(projects)
+        return itertools.chain.from_iterable(
+            get_items(project, replica=replica, first_page=first_page)
+            for project, first_page in zip(projects, first_pages)
         )
+
+    # Get the issues of every repository
+    issues = itertools.chain.from_iterable(
+        graphql.get_repo_closed_issues(owner=repository['owner'], repository=repository['repository'])
+        for repository in config.repositories
+    )
+
+    # Repository issues carry no project field values
+    return (ProjectItem(None, None, (), issue) for issue in issues)
+
+def project_query(project, replica=None):
+    """
+    Return the project filter the first page of the project is fetched with
+    """
+    if not filters_supported:
+        return None
+
+    if replica:
+        scope = project_scope(project)
+        if replica.needs_full_sync(scope, config.replica_full_sync_hours):
+            return None
+        return replica.incremental_query(scope)
+
+    if config.server_side_filter:
+        return graphql.candidate_items_query(config.required_field_names)
+
+    return None
+
+def get_first_pages(projects):
+    """
+    Fetch the first pages of several projects with a few aliased requests.
+    A project whose first page is None fetches it with its own scan.
+    """
+    if len(projects) < 2:
+        return [None] * len(projects)
+
+    try:
+        return graphql.get_projects_first_pages(projects, config.required_field_names)
+    except RequestError as e:
+        if e.refused:
+            raise
+        logger.warning(f'Could not fetch the first pages of the projects together ({e}), scanning each one on its own')
+        return [None] * len(projects)
+
+def get_items(project, replica=None, first_page=None):
+    """
+    Yield the closed items of one project, from the replica, the server-side
+    filtered candidates or a scan of every item
+    """
+    logger.info(f'Scanning project {project_scope(project)}')
+
+    if replica:
+        sync_replica(project, replica, first_page=first_page)
+        yield from replica.closed_items(project_scope(project))
+    elif config.server_side_filter and filters_supported:
+        yield from get_candidate_items(project, first_page=first_page)
     else:
-        # Get the issues
-        issues = graphql.get_repo_closed_issues(
-            owner=config.repository_owner,
-            repository=config.repository_name
+        yield from graphql.get_project_items(
+            owner=project['owner'],
+            owner_type=project['owner_type'],
+            project_number=project['project_number'],
+            field_names=config.required_field_names,
+            filters={'closed_only': True},
+            first_page=first_page
         )
 
-    # Check if there are issues available
-    if not issues:
-        logger.info('No issues has been found')
+def get_candidate_items(project, first_page=None):
+    """
+    Let the server select the closed issue candidates, falling back to
+    filtering every project item locally when it cannot
+    """
+    scan = {
+        'owner': project['owner'],
+        'owner_type': project['owner_type'],
+        'project_number': project['project_number'],
+        'field_names': config.required_field_names,
+        'filters': {'closed_only': True},
+    }
+
+    yielded = False
+    try:
+        for item in graphql.get_project_items(**scan, query=graphql.candidate_items_query(config.required_field_names), strict=True, first_page=first_page):
+            yielded = True
+            yield item
+    except RequestError as e:
+        if e.refused:
+            raise
+        if yielded:
+            # Rescanning now would notify the items already yielded twice
+            logger.error(f'Stopped the project scan: {e}')
+            return
+
+        logger.warning(f'Server-side filtering failed ({e}), falling back to filtering every project item')
+        filters_rejected(e)
+        yield from graphql.get_project_items(**scan)
+
+def filters_rejected(error):
+    """
+    Stop sending project item filters for the rest of the process when the
+    server rejected one, so later runs do not fail and fall back again. Errors
+    that would fail the unfiltered scan as well, a project that cannot be found
+    or a server that kept failing, say nothing about the filter.
+    """
+    global filters_supported
+    if not isinstance(error, GraphQLError) or error.transient:
         return
-
-    for projectItem in issues:
-        issue = projectItem['content']
-
-        # Get the list of assignees
-        assignees = issue['assignees']['nodes']
-
-        comment_text = f"Kindly set the missing required fields for the project: Status, Due Date, Time Spent, Release, Estimate, Priority, Size, Week."
-        issue_id = issue['id']
-        
-        # Check if the comment already exists
-        if not utils.check_comment_exists(issue['id'], comment_text):
-            if config.notification_type == 'comment':
-                # Prepare the notification content
-                comment = utils.prepare_missing_fields_comment(
-                    issue=issue,
-                    assignees=assignees, 
-                )
-    
-                if not config.dry_run:
-                    # Add the comment to the issue
-                    graphql.add_issue_comment(issue_id, comment)    
-                logger.info(f'Comment added to issue {issue_id}')
-                
-def notify_missing_duedate():
-    if config.is_enterprise:
-        issues = graphql.get_project_issues_duedate(
-            owner=config.repository_owner,
-            owner_type=config.repository_owner_type,
-            project_number=config.project_number,
-            duedate_field_name=config.duedate_field_name,
-            filters={'empty_duedate': True, 'closed_only': True}
-        )
-    else:
-        # Get the issues
-        issues = graphql.get_repo_closed_issues(
-            owner=config.repository_owner,
-            repository=config.repository_name
-        )
-        
-    # Check if there are issues available
-    if not issues:
-        logger.info('No issues has been found')
+    if any(entry.get('type') == 'NOT_FOUND' for entry in error.errors):
         return
-
-    for projectItem in issues:
-        issue = projectItem['content']
-
-        # Get the list of assignees
-        assignees = issue['assignees']['nodes']
-
-        comment_text = f"Kindly set the missing required fields for the project: Status, Due Date, Time Spent, Release, Estimate, Priority, Size, Week."
-        issue_id = issue['id']
-        
-        # Check if the comment already exists
-        if not utils.check_comment_exists(issue_id, comment_text):
-            if config.notification_type == 'comment':
-                # Prepare the notification content
-                comment = utils.prepare_missing_fields_comment(
-                    issue=issue,
-                    assignees=assignees, 
-                )
-    
-                if not config.dry_run:
-                    # Add the comment to the issue
-                    graphql.add_issue_comment(issue_id, comment)    
-                logger.info(f'Comment added to issue {issue_id}')
-
-
-def notify_missing_estimate():
-    if config.is_enterprise:
-        issues = graphql.get_project_issues_estimate(
-            owner=config.repository_owner,
-            owner_type=config.repository_owner_type,
-            project_number=config.project_number,
-            estimate_field_name=config.estimate_field_name,
-            filters={'empty_estimate': True, 'closed_only': True}
-        )
-    else:
-        # Get the issues
-        issues = graphql.get_repo_closed_issues(
-            owner=config.repository_owner,
-            repository=config.repository_name
+    filters_supported = False
+
+def sync_replica(project, replica, first_page=None):
+    """
+    Bring the replica of the project up to date, incrementally when possible
+    """
+    scope = project_scope(project)
+    full = project['query'] is None
+    query = project['query']
+
+    def fetch(query=None, first_page=None):
+        return graphql.get_project_items(
+            owner=project['owner'],
+            owner_type=project['owner_type'],
+            project_number=project['project_number'],
+            field_names=config.required_field_names,
+            query=query,
+            strict=True,
+            first_page=first_page
         )
 
-    # Check if there are issues available
-    if not issues:
-        logger.info('No issues has been found')
+    try:
+        with get_metrics().phase('sync_replica', scope=scope):
+            try:
+                synced = replica.sync(scope, fetch(query, first_page=first_page), full=full)
+            except GraphQLError as e:
+                if full:
+                    raise
+                # The server may not support filtering project items
+                logger.warning(f'Incremental sync failed ({e}), falling back to a full sync')
+                filters_rejected(e)
+                full = True
+                synced = replica.sync(scope, fetch(), full=True)
+    except RequestError as e:
+        if e.refused:
+            raise
+        logger.error(f'Replica sync of {scope} failed, evaluating the items synced by earlier runs: {e}')
         return
 
-    for projectItem in issues:
-        issue = projectItem['content']
-
-        # Get the list of assignees
-        assignees = issue['assignees']['nodes']
-
-        comment_text = f"Kindly set the missing required fields for the project: Status, Due Date, Time Spent, Release, Estimate, Priority, Size, Week."
-        issue_id = issue['id']
-        
-        # Check if the comment already exists
-        if not utils.check_comment_exists(issue_id, comment_text):
-            if config.notification_type == 'comment':
-                # Prepare the notification content
-                comment = utils.prepare_missing_fields_comment(
-                    issue=issue,
-                    assignees=assignees, 
-                )
-    
-                if not config.dry_run:
-                    # Add the comment to the issue
-                    graphql.add_issue_comment(issue_id, comment)    
-                logger.info(f'Comment added to issue {issue_id}')
- 
-def notify_missing_release():
-    if config.is_enterprise:
-        issues = graphql.get_project_issues_release(
-            owner=config.repository_owner,
-            owner_type=config.repository_owner_type,
-            project_number=config.project_number,
-            release_field_name=config.release_field_name,
-            filters={'empty_release': True, 'closed_only': True}
-        )
-    else:
-        # Get the issues
-        issues = graphql.get_repo_closed_issues(
-            owner=config.repository_owner,
-            repository=config.repository_name
-        )
-
-    # Check if there are issues available
-    if not issues:
+    logger.info(f"Replica of {scope} synced {synced} items ({'full sync' if full else query})")
+
+def flagged_issues(items):
+    """
+    Work out the missing fields of each closed issue and yield (issue, missing_fields)
+    for the issues missing any. An issue on several of the configured projects
+    is yielded once, after every project was scanned, with the fields missing on
+    any of them, so its notice does not alternate between the projects.
+    """
+    global last_updated_at
+
+    merged = {} if config.is_enterprise and len(config.projects) > 1 else None
+    latest = last_updated_at or ''
+    for projectItem in items:
+        issue = projectItem.issue
+        run_stats['evaluated'] += 1
+
+        # Items edited since the previous run tell a long-running service that the board is changing
+        updated_at = max(projectItem.updated_at or '', issue.updated_at or '')
+        if last_updated_at is not None and updated_at > last_updated_at:
+            run_stats['changed'] += 1
+        latest = max(latest, updated_at)
+
+        missing_fields = utils.get_missing_fields(projectItem, config.required_field_names)
+        if not missing_fields:
+            continue
+        if merged is None:
+            yield issue, missing_fields
+        else:
+            merged.setdefault(issue.id, (issue, set()))[1].update(missing_fields)
+
+    last_updated_at = latest
+
+    for issue, missing_fields in (merged or {}).values():
+        yield issue, [field_name for field_name in config.required_field_names if field_name in missing_fields]
+
+def pending_batches(items, ledger=None):
+    """
+    Yield batches of (issue, missing_fields, fingerprint) entries still to be
+    checked for the flagged issues. Issues the ledger already holds for the
+    same missing fields are skipped.
+    """
+    notified = 0
+    pending = []
+    for issue, missing_fields in flagged_issues(items):
+        notified += 1
+        run_stats['flagged'] += 1
+
+        fingerprint = utils.missing_fields_fingerprint(missing_fields)
+        if ledger and ledger.is_notified(issue.id, fingerprint):
+            continue
+
+        # Look up the comments of a whole batch of issues at once
+        pending.append((issue, missing_fields, fingerprint))
+        run_stats['pending'] += 1
+        if len(pending) >= config.comment_batch_size:
+            yield pending
+            pending = []
+
+    if pending:
+        yield pending
+
+    # Check if there were issues available
+    if not notified:
         logger.info('No issues has been found')
-        return
 
-    for projectItem in issues:
-        issue = projectItem['content']
-
-        # Get the list of assignees
-        assignees = issue['assignees']['nodes']
-
-        comment_text = f"Kindly set the missing required fields for the project: Status, Due Date, Time Spent, Release, Estimate, Priority, Size, Week."
-        issue_id = issue['id']
-        
-        # Check if the comment already exists
-        if not utils.check_comment_exists(issue_id, comment_text):
-            if config.notification_type == 'comment':
-                # Prepare the notification content
-                comment = utils.prepare_missing_fields_comment(
-                    issue=issue,
-                    assignees=assignees, 
-                )
-    
-                if not config.dry_run:
-                    # Add the comment to the issue
-                    graphql.add_issue_comment(issue_id, comment)    
-                logger.info(f'Comment added to issue {issue_id}')
-    
-                
-def notify_missing_priority():
-    if config.is_enterprise:
-        issues = graphql.get_project_issues_priority(
-            owner=config.repository_owner,
-            owner_type=config.repository_owner_type,
-            project_number=config.project_number,
-            priority_field_name=config.priority_field_name,
-            filters={'empty_priority': True, 'closed_only': True}
-        )
-    else:
-        # Get the issues
-        issues = graphql.get_repo_closed_issues(
-            owner=config.repository_owner,
-            repository=config.repository_name
-        )
+def notify_missing_fields(items, ledger=None):
+    """
+    Notify the assignees of each closed issue once with a single comment that
+    lists all of its missing fields
+    """
+    with profiling.section('notify_missing_fields'), tracing.span('notify_missing_fields', 'phase'):
+        if config.notification_type == 'email':
+            notify_by_email(items, ledger=ledger)
+            return
+        for pending in pending_batches(items, ledger=ledger):
+            notify_issues(pending, ledger=ledger)
+
+def notify_by_email(items, ledger=None):
+    """
+    Send every assignee a single digest of their closed issues with missing
+    fields, all over one SMTP connection. An issue counts as notified once the
+    digests of all of its assignees with an email address went out.
+    """
+    import digest
+
+    pending = [entry for batch in pending_batches(items, ledger=ledger) for entry in batch]
+    digests, unreachable = digest.group_by_assignee(pending)
+    for issue in unreachable:
+        logger.info(f'No assignee email address found for issue #{issue.number}')
+
+    with get_metrics().phase('send_digests', items=len(digests)):
+        with digest.SmtpSender(
+            config.smtp_host,
+            config.smtp_port,
+            security=config.smtp_security,
+            username=config.smtp_username,
+            password=config.smtp_password
+        ) as sender:
+            delivered = digest.send_digests(digests, sender, config.smtp_sender, dry_run=config.dry_run)
+    run_stats['emails'] += len(delivered)
+
+    for issue, _, fingerprint in pending:
+        addresses = {address.lower() for address in issue.assignee_emails if address}
+        if not addresses or not addresses <= delivered:
+            continue
+        if ledger and not config.dry_run:
+            ledger.record(issue.id, fingerprint)
+        run_stats['notified'] += 1
+
+def issue_notices(pending):
+    """
+    Return the (text, fingerprint) of the notice expected on each pending issue, keyed by issue id
+    """
+    return {
+        issue.id: (utils.missing_fields_notice(missing_fields), fingerprint)
+        for issue, missing_fields, fingerprint in pending
+    }
+
+def prepare_comments(pending, found, ledger=None):
+    """
+    Return (issue_id, comment, fingerprint, comment_id) for every pending issue
+    that does not carry the notice yet. comment_id is the notice written for
+    other missing fields to update in place, or None to add a new comment.
+    """
+    comments = []
+    unchecked = []
+    for issue, missing_fields, fingerprint in pending:
+        issue_id = issue.id
+
+        state, comment_id = found.get(issue_id) or (None, None)
+        if state == 'current':
+            if ledger:
+                ledger.record(issue_id, fingerprint)
+            continue
+        if state == 'unchecked':
+            unchecked.append(issue)
+            continue
+
+        # Get the logins of the assignees
+        assignees = issue.assignees
+
+        if config.notification_type == 'comment':
+            # Prepare the notification content
+            comment = utils.prepare_missing_fields_comment(
+                issue=issue,
+                assignees=assignees,
+                missing_fields=missing_fields,
+            )
+            comments.append((issue_id, comment, fingerprint, comment_id))
+
+    if unchecked:
+        skip_unchecked(unchecked, 'the server reported errors on them')
 
-    # Check if there are issues available
-    if not issues:
-        logger.info('No issues has been found')
-        return
-
-    for projectItem in issues:
-        issue = projectItem['content']
-
-        # Get the list of assignees
-        assignees = issue['assignees']['nodes']
-
-        comment_text = f"Kindly set the missing required fields for the project: Status, Due Date, Time Spent, Release, Estimate, Priority, Size, Week."
-        issue_id = issue['id']
-        
-        # Check if the comment already exists
-        if not utils.check_comment_exists(issue_id, comment_text):
-            if config.notification_type == 'comment':
-                # Prepare the notification content
-                comment = utils.prepare_missing_fields_comment(
-                    issue=issue,
-                    assignees=assignees, 
-                )
-    
-                if not config.dry_run:
-                    # Add the comment to the issue
-                    graphql.add_issue_comment(issue_id, comment)    
-                logger.info(f'Comment added to issue {issue_id}')
-      
-def notify_missing_size():
-    if config.is_enterprise:
-        issues = graphql.get_project_issues_size(
-            owner=config.repository_owner,
-            owner_type=config.repository_owner_type,
-            project_number=config.project_number,
-            size_field_name=config.size_field_name,
-            filters={'empty_size': True, 'closed_only': True}
-        )
+    if config.dry_run:
+        for issue_id, _, _, comment_id in comments:
+            record_comment(issue_id, comment_id)
+        return []
+
+    return comments
+
+def comment_batches(comments):
+    """
+    Split the comments into the batches posted in a single request, keeping
+    new comments and in-place updates in separate batches
+    """
+    batches = []
+    for kind in [
+        [comment for comment in comments if comment[3] is None],
+        [comment for comment in comments if comment[3] is not None],
+    ]:
+        batches += [
+            kind[start:start + config.comment_post_batch_size]
+            for start in range(0, len(kind), config.comment_post_batch_size)
+        ]
+    return batches
+
+def is_update(batch):
+    """
+    Check whether a comment batch updates notices in place rather than adding new ones
+    """
+    return batch[0][3] is not None
+
+def batch_comments(batch):
+    """
+    Return the (issue_id, body) pairs of a batch of new comments, or the
+    (comment_id, body) pairs of a batch of updates
+    """
+    if is_update(batch):
+        return [(comment_id, comment) for _, comment, _, comment_id in batch]
+    return [(issue_id, comment) for issue_id, comment, _, _ in batch]
+
+def batch_results(batch, results):
+    """
+    Return whether each issue of a posted batch got its notice, keyed by issue id,
+    from the results of the mutation keyed by issue or comment id
+    """
+    if is_update(batch):
+        return {issue_id: results.get(comment_id) for issue_id, _, _, comment_id in batch}
+    return results
+
+def post_comments(batch):
+    """
+    Add the new comments or apply the updates of a batch, and return whether
+    each issue got its notice, keyed by issue id
+    """
+    post = graphql.update_issue_comments if is_update(batch) else graphql.add_issue_comments
+    with get_metrics().phase('post_comments', items=len(batch)):
+        return batch_results(batch, post(batch_comments(batch)))
+
+async def post_comments_async(batch):
+    """
+    Asyncio variant of post_comments
+    """
+    import async_graphql
+
+    post = async_graphql.update_issue_comments if is_update(batch) else async_graphql.add_issue_comments
+    with get_metrics().phase('post_comments', items=len(batch)):
+        return batch_results(batch, await post(batch_comments(batch)))
+
+def record_comment(issue_id, comment_id=None):
+    """
+    Count and log a notice added to an issue, or updated in place when comment_id is set
+    """
+    run_stats['notified'] += 1
+    if comment_id:
+        run_stats['updated'] += 1
+        logger.info(f'Comment {comment_id} updated on issue {issue_id}')
     else:
-        # Get the issues
-        issues = graphql.get_repo_closed_issues(
-            owner=config.repository_owner,
-            repository=config.repository_name
-        )
-
-    # Check if there are issues available
-    if not issues:
-        logger.info('No issues has been found')
+        logger.info(f'Comment added to issue {issue_id}')
+
+def record_comments(batch, added, ledger=None):
+    """
+    Log the outcome of a posted comment batch, remember the added ones and
+    return the ids of the issues whose notice could not be posted
+    """
+    failed = []
+    for issue_id, _, fingerprint, comment_id in batch:
+        if not added.get(issue_id):
+            logger.error(f"Failed to {'update the comment of' if comment_id else 'add comment to'} issue {issue_id}")
+            failed.append(issue_id)
+            continue
+        if ledger:
+            ledger.record(issue_id, fingerprint)
+        record_comment(issue_id, comment_id)
+    return failed
+
+def notice_batches(pending, found, ledger=None):
+    """
+    Return the batches of comments to add or update on the pending issues,
+    given the notices already found on them, several per request
+    """
+    return comment_batches(prepare_comments(pending, found, ledger=ledger))
+
+def skip_unchecked(pending, error):
+    """
+    Log the pending issues whose comments could not be read. Without the full
+    comment history a notice could be posted twice, so they wait for the next run.
+    """
+    logger.error(f'Skipping {len(pending)} issues, could not read their comments: {error}')
+
+def record_batches(pending, batches, results, ledger=None):
+    """
+    Record the outcome of every posted batch as its result comes in and return
+    the pending entries of the issues whose notice could not be posted. A
+    mutation that timed out may still have been run, so their comments are
+    read again before the notice is resent.
+    """
+    failed = set()
+    for batch, added in zip(batches, results):
+        failed.update(record_comments(batch, added, ledger=ledger))
+
+    entries = [entry for entry in pending if entry[0].id in failed]
+    if entries:
+        logger.info(f'Checking the comments of {len(entries)} issues again before resending their notices')
+    return entries
+
+def notify_issues(pending, ledger=None, recheck=True):
+    """
+    Notify every (issue, missing_fields, fingerprint) entry that does not carry
+    the notice yet. With recheck, the issues whose notice failed are checked
+    and notified once more.
+    """
+    try:
+        with get_metrics().phase('check_comments', items=len(pending)):
+            found = utils.find_notices(issue_notices(pending))
+    except RequestError as e:
+        skip_unchecked(pending, e)
         return
 
-    for projectItem in issues:
-        issue = projectItem['content']
-
-        # Get the list of assignees
-        assignees = issue['assignees']['nodes']
-
-        comment_text = f"Kindly set the missing required fields for the project: Status, Due Date, Time Spent, Release, Estimate, Priority, Size, Week."
-        issue_id = issue['id']
-        
-        # Check if the comment already exists
-        if not utils.check_comment_exists(issue_id, comment_text):
-            if config.notification_type == 'comment':
-                # Prepare the notification content
-                comment = utils.prepare_missing_fields_comment(
-                    issue=issue,
-                    assignees=assignees, 
-                )
-    
-                if not config.dry_run:
-                    # Add the comment to the issue
-                    graphql.add_issue_comment(issue_id, comment)    
-                logger.info(f'Comment added to issue {issue_id}')
-                
-def notify_missing_week():
-    if config.is_enterprise:
-        issues = graphql.get_project_issues_week(
-            owner=config.repository_owner,
-            owner_type=config.repository_owner_type,
-            project_number=config.project_number,
-            week_field_name=config.week_field_name,
-            filters={'empty_week': True, 'closed_only': True}
-        )
-    else:
-        # Get the issues
-        issues = graphql.get_repo_closed_issues(
-            owner=config.repository_owner,
-            repository=config.repository_name
-        )
-
-    # Check if there are issues available
-    if not issues:
-        logger.info('No issues has been found')
+    batches = notice_batches(pending, found, ledger=ledger)
+    failed = record_batches(pending, batches, (post_comments(batch) for batch in batches), ledger=ledger)
+    if failed and recheck:
+        notify_issues(failed, ledger=ledger, recheck=False)
+
+async def notify_issues_async(pending, ledger=None, recheck=True):
+    """
+    Asyncio variant of notify_issues, posting the comment batches concurrently
+    """
+    import asyncio
+
+    try:
+        with get_metrics().phase('check_comments', items=len(pending)):
+            found = await utils.find_notices_async(issue_notices(pending))
+    except RequestError as e:
+        skip_unchecked(pending, e)
         return
 
-    for projectItem in issues:
-        issue = projectItem['content']
-
-        # Get the list of assignees
-        assignees = issue['assignees']['nodes']
-
-        comment_text = f"Kindly set the missing required fields for the project: Status, Due Date, Time Spent, Release, Estimate, Priority, Size, Week."
-        issue_id = issue['id']
-        
-        # Check if the comment already exists
-        if not utils.check_comment_exists(issue_id, comment_text):
-            if config.notification_type == 'comment':
-                # Prepare the notification content
-                comment = utils.prepare_missing_fields_comment(
-                    issue=issue,
-                    assignees=assignees, 
-                )
-    
-                if not config.dry_run:
-                    # Add the comment to the issue
-                    graphql.add_issue_comment(issue_id, comment)    
-                logger.info(f'Comment added to issue {issue_id}')
-
-def notify_missing_timespent():
-    if config.is_enterprise:
-        issues = graphql.get_project_issues_timespent(
-            owner=config.repository_owner,
-            owner_type=config.repository_owner_type,
-            project_number=config.project_number,
-            timespent_field_name=config.timespent_field_name,
-            filters={'empty_timespent': True, 'closed_only': True}
-        )
-    else:
-        # Get the issues
-        issues = graphql.get_repo_closed_issues(
-            owner=config.repository_owner,
-            repository=config.repository_name
-        )
+    batches = notice_batches(pending, found, ledger=ledger)
+    results = await asyncio.gather(*(post_comments_async(batch) for batch in batches))
+    failed = record_batches(pending, batches, results, ledger=ledger)
+    if failed and recheck:
+        await notify_issues_async(failed, ledger=ledger, recheck=False)
+
+async def notify_missing_fields_async(items, ledger=None):
+    """
+    Asyncio engine for notify_missing_fields: the project scan keeps running in
+    a worker thread while the comment checks and posts of earlier batches run
+    concurrently, bounded by max_in_flight
+    """
+    import asyncio
+    import async_graphql
+
+    batches = pending_batches(items, ledger=ledger)
+    tasks = set()
+    try:
+        while True:
+            pending = await asyncio.to_thread(next, batches, None)
+            if pending is None:
+                break
+
+            tasks.add(asyncio.create_task(notify_issues_async(pending, ledger=ledger)))
+            if len(tasks) >= config.max_in_flight:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    task.result()
+
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await async_graphql.close_client()
+
+def report_rate_limit(summary):
+    """
+    Log how much of the rate limit budget this run used
+    """
+    logger.info(
+        f"Rate limit budget used: {summary['used']} points over {summary['requests']} requests, "
+        f"{summary['remaining']} of {summary['limit']} remaining, waited {summary['waited']}s"
+    )
+    for operation, usage in summary['operations'].items():
+        logger.info(f"  {operation}: {usage['cost']} points over {usage['requests']} requests")
+
+def run(ledger=None, replica=None):
+    """
+    Run one scan-and-notify cycle, emit its metrics and return its counters
+    """
+    run_stats.clear()
+    run_metrics = get_metrics()
+    run_metrics.reset()
+    scheduler = graphql.get_client().scheduler
+    usage = scheduler.snapshot()
+    try:
+        with run_metrics.phase('run'):
+            # A single scan of the project feeds every check below; the time
+            # spent producing each item is recorded as the scan phase
+            items = run_metrics.timed('scan', get_project_items(replica=replica))
+            if config.execution_mode == 'async' and config.notification_type == 'comment':
+                # The asyncio stack is only imported by the runs that use it
+                import asyncio
+                with profiling.section('notify_missing_fields_async'), tracing.span('notify_missing_fields_async', 'phase'):
+                    asyncio.run(notify_missing_fields_async(items, ledger=ledger))
+            else:
+                notify_missing_fields(items, ledger=ledger)
+    except RateLimitExceeded as e:
+        logger.warning(f'Rate limit budget exhausted, deferring the remaining work to the next run: {e}')
+    finally:
+        summary = scheduler.summary(since=usage)
+        report_rate_limit(summary)
+        report = run_metrics.report(run_stats, summary)
+        try:
+            metrics.emit(report, config.metrics_path, config.step_summary_path)
+        except OSError as e:
+            logger.warning(f'Could not write the run metrics: {e}')
+
+    return dict(run_stats)
+
+def open_stores():
+    """
+    Open the notified-issue ledger and the project replica when they are enabled
+    """
+    ledger = NotificationLedger(config.ledger_path, config.ledger_ttl_hours) if config.ledger_path else None
+    replica = ProjectReplica(config.replica_path, selection=queries.issue_selection()) if config.replica_path else None
+    return ledger, replica
 
-    # Check if there are issues available
-    if not issues:
-        logger.info('No issues has been found')
-        return
-
-    for projectItem in issues:
-        issue = projectItem['content']
-
-        # Get the list of assignees
-        assignees = issue['assignees']['nodes']
-
-        comment_text = f"Kindly set the missing required fields for the project: Status, Due Date, Time Spent, Release, Estimate, Priority, Size, Week."
-        issue_id = issue['id']
-        
-        # Check if the comment already exists
-        if not utils.check_comment_exists(issue_id, comment_text):
-            if config.notification_type == 'comment':
-                # Prepare the notification content
-                comment = utils.prepare_missing_fields_comment(
-                    issue=issue,
-                    assignees=assignees, 
-                )
-    
-                if not config.dry_run:
-                    # Add the comment to the issue
-                    graphql.add_issue_comment(issue_id, comment)    
-                logger.info(f'Comment added to issue {issue_id}')
-    
 def main():
     logger.info('Process started...')
     if config.dry_run:
         logger.info('DRY RUN MODE ON!')
 
-    notify_missing_status()
-    notify_missing_duedate()
-    notify_missing_estimate()
-    notify_missing_release()
-    notify_missing_priority()
-    notify_missing_size()
-    notify_missing_week()
-    notify_missing_timespent()
+    ledger, replica = open_stores()
+    try:
+        with profiling.profiled(config.profile_path), tracing.traced(config.trace_path):
+            run(ledger=ledger, replica=replica)
+    finally:
+        if ledger:
+            ledger.close()
+        if replica:
+            replica.close()
 
 if __name__ == "__main__":
-    main()
+    if config.run_mode == 'daemon':
+        import service
+        service.serve()
+    elif config.run_mode == 'webhook':
+        import webhook
+        webhook.serve()
+    else:
+        main()
@@ -0,0 +1,268 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+import tracing
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+
+class Histogram:
+    """
+    Latency histogram with fixed buckets, in the Prometheus layout
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        index = next((index for index, bound in enumerate(self.buckets) if seconds <= bound), len(self.buckets))
+        self.counts[index] += 1
+        self.sum += seconds
+        self.count += 1
+        self.max = max(self.max, seconds)
+
+    def cumulative(self):
+        """
+        Return (upper bound, observations at or below it) for every bucket, ending with +Inf
+        """
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + [float('inf')], self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def quantile(self, q):
+        """
+        Return the upper bound of the bucket holding the q quantile
+        """
+        if not self.count:
+            return 0.0
+        for bound, total in self.cumulative():
+            if total >= q * self.count:
+                return self.max if bound == float('inf') else min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'max': round(self.max, 6),
+            'p50': round(self.quantile(0.5), 6),
+            'p95': round(self.quantile(0.95), 6),
+            'buckets': {('+Inf' if bound == float('inf') else str(bound)): total for bound, total in self.cumulative()},
+        }
+
+
+class RunMetrics:
+    """
+    Instrumentation of one run: requests, bytes and latency per GraphQL
+    operation, pages fetched, and time spent in each phase
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started_at = self.clock()
+            self.requests = {}
+            self.bytes = {}
+            self.points = {}
+            self.pages = {}
+            self.request_latency = {}
+            self.phase_latency = {}
+
+    def record_request(self, operation, seconds, size):
+        """
+        Count a GraphQL request, its response size and latency
+        """
+        with self.lock:
+            self.requests[operation] = self.requests.get(operation, 0) + 1
+            self.bytes[operation] = self.bytes.get(operation, 0) + size
+            self.request_latency.setdefault(operation, Histogram()).observe(seconds)
+
+    def record_points(self, operation, cost):
+        """
+        Count the rate limit points a GraphQL request cost
+        """
+        with self.lock:
+            self.points[operation] = self.points.get(operation, 0) + (cost or 0)
+
+    def record_page(self, operation):
+        with self.lock:
+            self.pages[operation] = self.pages.get(operation, 0) + 1
+
+    def observe_phase(self, phase, seconds):
+        with self.lock:
+            self.phase_latency.setdefault(phase, Histogram()).observe(seconds)
+
+    @contextmanager
+    def phase(self, name, **attributes):
+        """
+        Time the enclosed block as one observation of the given phase, and
+        trace it as a span with the given attributes
+        """
+        started_at = self.clock()
+        try:
+            with tracing.span(name, 'phase', **attributes):
+                yield
+        finally:
+            self.observe_phase(name, self.clock() - started_at)
+
+    def timed(self, phase, iterable):
+        """
+        Yield from iterable, timing every step it takes to produce an entry as the given phase
+        """
+        iterator = iter(iterable)
+        while True:
+            started_at = self.clock()
+            try:
+                entry = next(iterator)
+            except StopIteration:
+                self.observe_phase(phase, self.clock() - started_at)
+                return
+            self.observe_phase(phase, self.clock() - started_at)
+            yield entry
+
+    def report(self, stats=None, rate_limit=None):
+        """
+        Return the metrics of the run as a JSON-serializable document
+        """
+        rate_limit = rate_limit or {}
+        with self.lock:
+            operations = sorted(set(self.requests) | set(self.pages))
+            return {
+                'duration': round(self.clock() - self.started_at, 6),
+                'items': dict(stats or {}),
+                'totals': {
+                    'requests': sum(self.requests.values()),
+                    'pages': sum(self.pages.values()),
+                    'points': sum(self.points.values()),
+                    'bytes': sum(self.bytes.values()),
+                },
+                'operations': {
+                    operation: {
+                        'requests': self.requests.get(operation, 0),
+                        'pages': self.pages.get(operation, 0),
+                        'points': self.points.get(operation, 0),
+                        'bytes': self.bytes.get(operation, 0),
+                        'latency': self.request_latency[operation].to_dict() if operation in self.request_latency else None,
+                    }
+                    for operation in operations
+                },
+                'phases': {phase: histogram.to_dict() for phase, histogram in sorted(self.phase_latency.items())},
+                'rate_limit': {key: rate_limit.get(key) for key in ['remaining', 'limit', 'waited']},
+            }
+
+
+def histogram_lines(name, label, value, histogram):
+    lines = []
+    for bound, total in histogram['buckets'].items():
+        lines.append(f'{name}_bucket{{{label}="{value}",le="{bound}"}} {total}')
+    lines.append(f'{name}_sum{{{label}="{value}"}} {histogram["sum"]}')
+    lines.append(f'{name}_count{{{label}="{value}"}} {histogram["count"]}')
+    return lines
+
+
+def prometheus(report):
+    """
+    Render a run report in the Prometheus text format
+    """
+    lines = [
+        '# TYPE missing_fields_run_duration_seconds gauge',
+        f"missing_fields_run_duration_seconds {report['duration']}",
+        '# TYPE missing_fields_run_items gauge',
+    ]
+    for outcome, count in sorted(report['items'].items()):
+        lines.append(f'missing_fields_run_items{{outcome="{outcome}"}} {count}')
+
+    for metric in ['requests', 'pages', 'points', 'bytes']:
+        lines.append(f'# TYPE missing_fields_run_{metric} gauge')
+        for operation, usage in report['operations'].items():
+            lines.append(f'missing_fields_run_{metric}{{operation="{operation}"}} {usage[metric]}')
+
+    lines.append('# TYPE missing_fields_request_duration_seconds histogram')
+    for operation, usage in report['operations'].items():
+        if usage['latency']:
+            lines += histogram_lines('missing_fields_request_duration_seconds', 'operation', operation, usage['latency'])
+
+    lines.append('# TYPE missing_fields_phase_duration_seconds histogram')
+    for phase, histogram in report['phases'].items():
+        lines += histogram_lines('missing_fields_phase_duration_seconds', 'phase', phase, histogram)
+
+    return '\n'.join(lines) + '\n'
+
+
+def markdown(report):
+    """
+    Render a run report as the Markdown tables of a GitHub job summary
+    """
+    totals = report['totals']
+    items = report['items']
+    lines = [
+        '### Missing fields run',
+        '',
+        f"{report['duration']:.2f}s, {totals['requests']} requests, {totals['pages']} pages, "
+        f"{totals['points']} points, {totals['bytes'] / 1024:.1f} KiB received. "
+        f"{items.get('evaluated', 0)} items evaluated, {items.get('flagged', 0)} flagged, "
+        f"{items.get('notified', 0)} notified.",
+        '',
+        '| Operation | Requests | Pages | Points | KiB | p50 (s) | p95 (s) | Max (s) |',
+        '| --- | ---: | ---: | ---: | ---: | ---: | ---: | ---: |',
+    ]
+    for operation, usage in report['operations'].items():
+        latency = usage['latency'] or {'p50': 0, 'p95': 0, 'max': 0}
+        lines.append(
+            f"| {operation} | {usage['requests']} | {usage['pages']} | {usage['points']} | "
+            f"{usage['bytes'] / 1024:.1f} | {latency['p50']} | {latency['p95']} | {latency['max']:.3f} |"
+        )
+
+    lines += [
+        '',
+        '| Phase | Count | Total (s) | p50 (s) | p95 (s) | Max (s) |',
+        '| --- | ---: | ---: | ---: | ---: | ---: |',
+    ]
+    for phase, histogram in report['phases'].items():
+        lines.append(
+            f"| {phase} | {histogram['count']} | {histogram['sum']:.3f} | {histogram['p50']} | "
+            f"{histogram['p95']} | {histogram['max']:.3f} |"
+        )
+
+    return '\n'.join(lines) + '\n'
+
+
+def emit(report, directory='', step_summary=''):
+    """
+    Write the run report as metrics.json and metrics.prom into the directory
+    and append its tables to the job summary, each when configured
+    """
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, 'metrics.json'), 'w') as file:
+            json.dump(report, file, indent=2)
+        with open(os.path.join(directory, 'metrics.prom'), 'w') as file:
+            file.write(prometheus(report))
+
+    if step_summary:
+        with open(step_summary, 'a') as file:
+            file.write(markdown(report))
+
+
+_metrics = RunMetrics()
+
+
+def get_metrics():
+    """
+    Return the metrics of the current run, shared by every module
+    """
+    return _metrics
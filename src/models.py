@@ -0,0 +1,103 @@
+"""
+Compact representations of the project items and issues a scan yields. They
+are built straight from each response page so the nested response dicts can
+be freed as soon as the page is parsed.
+"""
+import sys
+
+
+class IssueRef:
+    """
+    The fields of an issue the evaluation and the notices read. Assignee
+    logins, and their email addresses when selected, are packed in tuples.
+    """
+
+    __slots__ = ('id', 'title', 'number', 'state', 'updated_at', 'assignees', 'assignee_emails', 'url')
+
+    def __init__(self, id, title, number, state, updated_at=None, assignees=(), assignee_emails=(), url=None):
+        self.id = id
+        self.title = title
+        self.number = number
+        self.state = sys.intern(state) if state else state
+        self.updated_at = updated_at
+        self.assignees = assignees
+        self.assignee_emails = assignee_emails
+        self.url = url
+
+    @classmethod
+    def from_node(cls, node):
+        """
+        Build the issue from an issue node of a GraphQL response
+        """
+        assignees = (node.get('assignees') or {}).get('nodes') or []
+        return cls(
+            node['id'],
+            node.get('title'),
+            node.get('number'),
+            node.get('state'),
+            node.get('updatedAt'),
+            tuple(assignee['login'] for assignee in assignees),
+            # Addresses are only selected for email notices
+            tuple(assignee.get('email') or '' for assignee in assignees) if assignees and 'email' in assignees[0] else (),
+            node.get('url'),
+        )
+
+    def to_record(self):
+        return [
+            self.id, self.title, self.number, self.state, self.updated_at,
+            list(self.assignees), list(self.assignee_emails), self.url,
+        ]
+
+    @classmethod
+    def from_record(cls, record):
+        id, title, number, state, updated_at, assignees, assignee_emails, url = record
+        return cls(id, title, number, state, updated_at, tuple(assignees), tuple(assignee_emails), url)
+
+    def __repr__(self):
+        return f'IssueRef({self.id!r}, #{self.number}, {self.state})'
+
+
+class ProjectItem:
+    """
+    A project item with its issue and the names of the required fields that
+    have a value. The field names are shared with the configuration, so every
+    item only holds references to the same strings.
+    """
+
+    __slots__ = ('id', 'updated_at', 'fields', 'issue', 'project')
+
+    def __init__(self, id, updated_at, fields, issue, project=None):
+        self.id = id
+        self.updated_at = updated_at
+        self.fields = fields
+        self.issue = issue
+        # Owner and number of the project, only set on items read one at a time
+        self.project = project
+
+    @classmethod
+    def from_node(cls, node, aliases, field_names, issue=None):
+        """
+        Build the item from an item node whose field values are selected under
+        the given aliases, or attach the given issue when the node has no content
+        """
+        content = node.get('content')
+        return cls(
+            node.get('id'),
+            node.get('updatedAt'),
+            tuple(field_name for alias, field_name in zip(aliases, field_names) if node.get(alias)),
+            IssueRef.from_node(content) if content else issue,
+        )
+
+    def to_record(self):
+        """
+        Return the item as a JSON-serializable list, the layout the replica stores
+        """
+        return [self.id, self.updated_at, list(self.fields), self.issue.to_record() if self.issue else None]
+
+    @classmethod
+    def from_record(cls, record):
+        id, updated_at, fields, issue = record
+        return cls(id, updated_at, tuple(sys.intern(field_name) for field_name in fields), IssueRef.from_record(issue) if issue else None)
+
+    def __repr__(self):
+        return f'ProjectItem({self.id!r}, {self.issue!r}, fields={self.fields!r})'
@@ -0,0 +1,167 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from logger import logger
+
+# Number of entries in the text reports
+TOP_FUNCTIONS = 50
+TOP_ALLOCATIONS = 30
+# Frames kept for every traced allocation, enough to group them by call site
+TRACEMALLOC_FRAMES = 10
+
+
+class Profiler:
+    """
+    CPU and memory profile of one run: cProfile over the whole run, tracemalloc
+    for the allocations, and the wall time, CPU time and memory growth of every
+    section entered while it is active
+    """
+
+    def __init__(self, directory):
+        import cProfile
+        import tracemalloc
+
+        self.directory = directory
+        self.tracemalloc = tracemalloc
+        self.profile = cProfile.Profile()
+        self.lock = threading.Lock()
+        self.sections = {}
+
+    def start(self):
+        self.tracemalloc.start(TRACEMALLOC_FRAMES)
+        self.profile.enable()
+
+    def stop(self):
+        """
+        Stop profiling and return the allocation snapshot and the peak of traced memory
+        """
+        self.profile.disable()
+        snapshot = self.tracemalloc.take_snapshot()
+        peak = self.tracemalloc.get_traced_memory()[1]
+        self.tracemalloc.stop()
+        return snapshot, peak
+
+    @contextmanager
+    def section(self, name):
+        """
+        Attribute the wall time, CPU time and traced memory growth of the
+        enclosed block to the named section. Sections are inclusive of the
+        sections nested in them, and overlap when they run concurrently.
+        """
+        started_at = time.perf_counter()
+        cpu_started_at = time.process_time()
+        memory_before = self.tracemalloc.get_traced_memory()[0]
+        try:
+            yield
+        finally:
+            growth = self.tracemalloc.get_traced_memory()[0] - memory_before
+            self.record(name, time.perf_counter() - started_at, time.process_time() - cpu_started_at, growth)
+
+    def record(self, name, seconds, cpu_seconds, growth):
+        with self.lock:
+            section = self.sections.setdefault(name, {
+                'calls': 0, 'seconds': 0.0, 'cpu_seconds': 0.0, 'memory_growth': 0, 'max_memory_growth': 0,
+            })
+            section['calls'] += 1
+            section['seconds'] += seconds
+            section['cpu_seconds'] += cpu_seconds
+            section['memory_growth'] += growth
+            section['max_memory_growth'] = max(section['max_memory_growth'], growth)
+
+    def write(self, snapshot, peak):
+        """
+        Write profile.pstats, the profile.txt and allocations.txt reports and
+        sections.json into the directory
+        """
+        import io
+        import pstats
+
+        os.makedirs(self.directory, exist_ok=True)
+        self.profile.dump_stats(os.path.join(self.directory, 'profile.pstats'))
+
+        output = io.StringIO()
+        pstats.Stats(self.profile, stream=output).sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+        with open(os.path.join(self.directory, 'profile.txt'), 'w') as file:
+            file.write(output.getvalue())
+
+        sections = {
+            name: dict(section, seconds=round(section['seconds'], 6), cpu_seconds=round(section['cpu_seconds'], 6))
+            for name, section in sorted(self.sections.items())
+        }
+        with open(os.path.join(self.directory, 'sections.json'), 'w') as file:
+            json.dump(sections, file, indent=2)
+
+        with open(os.path.join(self.directory, 'allocations.txt'), 'w') as file:
+            file.write(allocations_report(snapshot, peak, sections))
+
+
+def allocations_report(snapshot, peak, sections):
+    """
+    Render the memory still allocated at the end of the run by source line and
+    by call site, and the memory growth of each section
+    """
+    snapshot = snapshot.filter_traces([
+        tracemalloc_filter('<frozen importlib._bootstrap>'),
+        tracemalloc_filter('<frozen importlib._bootstrap_external>'),
+        tracemalloc_filter(__file__),
+    ])
+    lines = [f'Peak traced memory: {peak / 1024:.1f} KiB', '', f'Top {TOP_ALLOCATIONS} allocations by line:']
+    for index, stat in enumerate(snapshot.statistics('lineno')[:TOP_ALLOCATIONS], 1):
+        frame = stat.traceback[0]
+        lines.append(f'{index:>3}. {frame.filename}:{frame.lineno}: {stat.size / 1024:.1f} KiB in {stat.count} blocks')
+
+    lines += ['', f'Top {TOP_ALLOCATIONS // 3} allocations by call site:']
+    for index, stat in enumerate(snapshot.statistics('traceback')[:TOP_ALLOCATIONS // 3], 1):
+        lines.append(f'{index:>3}. {stat.size / 1024:.1f} KiB in {stat.count} blocks')
+        lines += [f'       {line}' for line in stat.traceback.format(most_recent_first=True)]
+
+    lines += ['', 'Sections (inclusive of nested sections):']
+    for name, section in sections.items():
+        lines.append(
+            f"  {name}: {section['calls']} calls, {section['seconds']:.3f}s wall, {section['cpu_seconds']:.3f}s CPU, "
+            f"{section['memory_growth'] / 1024:+.1f} KiB retained, largest single call {section['max_memory_growth'] / 1024:+.1f} KiB"
+        )
+    return '\n'.join(lines) + '\n'
+
+
+def tracemalloc_filter(filename):
+    import tracemalloc
+    return tracemalloc.Filter(False, filename)
+
+
+_profiler = None
+
+
+@contextmanager
+def profiled(directory):
+    """
+    Profile the enclosed block and write the reports into the directory;
+    an empty directory disables profiling
+    """
+    global _profiler
+    if not directory:
+        yield
+        return
+
+    _profiler = Profiler(directory)
+    _profiler.start()
+    try:
+        yield
+    finally:
+        profiler, _profiler = _profiler, None
+        snapshot, peak = profiler.stop()
+        try:
+            profiler.write(snapshot, peak)
+            logger.info(f'Profile written to {directory}')
+        except OSError as e:
+            logger.warning(f'Could not write the profile: {e}')
+
+
+def section(name):
+    """
+    Return a context manager attributing the enclosed block to the named
+    section of the active profile, or doing nothing when not profiling
+    """
+    return _profiler.section(name) if _profiler else nullcontext()
@@ -0,0 +1,375 @@
+"""
+Builders of the GraphQL documents sent by the action. Every document only
+selects what the evaluation and the notices read, and is built once per
+shape and cached for the lifetime of the process.
+"""
+import functools
+import config
+
+RATE_LIMIT_SELECTION = """
+    rateLimit {
+        cost
+        remaining
+        limit
+        resetAt
+    }"""
+
+
+def compact(document):
+    """
+    Collapse the indentation of a GraphQL document, which carries no string
+    literals, so every request sends the smallest body
+    """
+    return ' '.join(document.split())
+
+
+ISSUE_COMMENTS_QUERY = compact(f"""
+query GetIssueComments($issueId: ID!, $afterCursor: String) {{{RATE_LIMIT_SELECTION}
+    node(id: $issueId) {{
+        ... on Issue {{
+            comments(first: 100, after: $afterCursor) {{
+                nodes {{
+                    id
+                    viewerDidAuthor
+                    body
+                }}
+                pageInfo {{
+                    endCursor
+                    hasNextPage
+                }}
+            }}
+        }}
+    }}
+}}
+""")
+
+ISSUES_RECENT_COMMENTS_QUERY = compact(f"""
+query GetIssuesRecentComments($ids: [ID!]!, $last: Int!) {{{RATE_LIMIT_SELECTION}
+    nodes(ids: $ids) {{
+        ... on Issue {{
+            id
+            comments(last: $last) {{
+                nodes {{
+                    id
+                    viewerDidAuthor
+                    body
+                }}
+                pageInfo {{
+                    hasPreviousPage
+                }}
+            }}
+        }}
+    }}
+}}
+""")
+
+# Tail-only comment scan: the newest comments of each issue are read without
+# their bodies, only telling whether the token's own account wrote them
+ISSUES_RECENT_COMMENT_AUTHORS_QUERY = compact(f"""
+query GetIssuesRecentCommentAuthors($ids: [ID!]!, $last: Int!) {{{RATE_LIMIT_SELECTION}
+    nodes(ids: $ids) {{
+        ... on Issue {{
+            id
+            comments(last: $last) {{
+                nodes {{
+                    id
+                    viewerDidAuthor
+                }}
+                pageInfo {{
+                    hasPreviousPage
+                    startCursor
+                }}
+            }}
+        }}
+    }}
+}}
+""")
+
+ISSUE_EARLIER_COMMENT_AUTHORS_QUERY = compact(f"""
+query GetIssueEarlierCommentAuthors($issueId: ID!, $before: String!) {{{RATE_LIMIT_SELECTION}
+    node(id: $issueId) {{
+        ... on Issue {{
+            comments(last: 100, before: $before) {{
+                nodes {{
+                    id
+                    viewerDidAuthor
+                }}
+                pageInfo {{
+                    hasPreviousPage
+                    startCursor
+                }}
+            }}
+        }}
+    }}
+}}
+""")
+
+# Bodies are only fetched for the comments the token's own account wrote
+COMMENT_BODIES_QUERY = compact(f"""
+query GetCommentBodies($ids: [ID!]!) {{{RATE_LIMIT_SELECTION}
+    nodes(ids: $ids) {{
+        ... on IssueComment {{
+            id
+            body
+        }}
+    }}
+}}
+""")
+
+# Identifies the project of a single item so it can be matched against the configured projects
+ITEM_PROJECT_SELECTION = """
+    project {
+        number
+        owner {
+            ... on Organization {
+                login
+            }
+            ... on User {
+                login
+            }
+        }
+    }"""
+
+# GitHub allows at most 10 assignees per issue
+MAX_ASSIGNEES = 10
+
+
+def field_aliases(count):
+    """
+    Return the aliases the requested fields are selected under
+    """
+    return [f'field{index}' for index in range(count)]
+
+
+def field_variables(count):
+    """
+    Return the variable definitions carrying the requested field names
+    """
+    return ''.join(f', ${alias}: String!' for alias in field_aliases(count))
+
+
+@functools.lru_cache(maxsize=None)
+def issue_selection():
+    """
+    Return the issue fields the evaluation and the notification read; the
+    replica sync compares updatedAt and only email digests need addresses and links
+    """
+    email = config.notification_type == 'email'
+    assignee_fields = 'login email' if email else 'login'
+    return f"""
+        id
+        title
+        number
+        state
+        updatedAt{' url' if email else ''}
+        assignees(first: {MAX_ASSIGNEES}) {{
+            nodes {{
+                {assignee_fields}
+            }}
+        }}"""
+
+
+def field_selections(count):
+    """
+    Return the aliased fieldValueByName selections. Only whether a field has
+    a value matters, so no value fragment is selected.
+    """
+    return ''.join(
+        f"""
+        {alias}: fieldValueByName(name: ${alias}) {{
+            __typename
+        }}"""
+        for alias in field_aliases(count)
+    )
+
+
+def items_selection(arguments, field_count):
+    """
+    Return the items(...) selection of a project with the given arguments.
+    totalCount feeds the rate limit plan of the scan.
+    """
+    return f"""
+    items({arguments}) {{
+        nodes {{
+            id
+            updatedAt{field_selections(field_count)}
+            content {{
+                ... on Issue {{{issue_selection()}
+                }}
+            }}
+        }}
+        pageInfo {{
+            endCursor
+            hasNextPage
+        }}
+        totalCount
+    }}"""
+
+
+@functools.lru_cache(maxsize=None)
+def repo_closed_issues_document():
+    """
+    Build the GetRepoClosedIssues document
+    """
+    return compact(f"""
+    query GetRepoClosedIssues($owner: String!, $repo: String!, $after: String) {{{RATE_LIMIT_SELECTION}
+        repository(owner: $owner, name: $repo) {{
+            issues(first: 100, after: $after, states: [CLOSED]) {{
+                nodes {{{issue_selection()}
+                }}
+                pageInfo {{
+                    endCursor
+                    hasNextPage
+                }}
+                totalCount
+            }}
+        }}
+    }}
+    """)
+
+
+@functools.lru_cache(maxsize=None)
+def project_items_document(owner_type, field_count, filtered):
+    """
+    Build the GetProjectItems document once per owner type, number of fields
+    and use of a project filter
+    """
+    items_filter = ', query: $query' if filtered else ''
+    query_variable = ', $query: String!' if filtered else ''
+
+    return compact(f"""
+    query GetProjectItems($owner: String!, $projectNumber: Int!{field_variables(field_count)}, $after: String{query_variable}) {{{RATE_LIMIT_SELECTION}
+        {owner_type}(login: $owner) {{
+            projectV2(number: $projectNumber) {{{items_selection(f'first: 100, after: $after{items_filter}', field_count)}
+            }}
+        }}
+    }}
+    """)
+
+
+@functools.lru_cache(maxsize=None)
+def projects_first_pages_document(field_count, projects):
+    """
+    Build the GetProjectsFirstPages document once per number of fields and
+    sequence of (owner_type, filtered) projects
+    """
+    variable_definitions = [f'${alias}: String!' for alias in field_aliases(field_count)]
+    selections = []
+    for index, (owner_type, filtered) in enumerate(projects):
+        variable_definitions += [f'$owner{index}: String!', f'$number{index}: Int!']
+
+        arguments = 'first: 100'
+        if filtered:
+            variable_definitions.append(f'$query{index}: String!')
+            arguments += f', query: $query{index}'
+
+        selections.append(f"""
+        project{index}: {owner_type}(login: $owner{index}) {{
+            projectV2(number: $number{index}) {{{items_selection(arguments, field_count)}
+            }}
+        }}""")
+
+    return compact(f"""
+    query GetProjectsFirstPages({', '.join(variable_definitions)}) {{{RATE_LIMIT_SELECTION}{''.join(selections)}
+    }}
+    """)
+
+
+@functools.lru_cache(maxsize=None)
+def project_item_document(field_count):
+    """
+    Build the GetProjectItem document reading a single item once per number of fields
+    """
+    return compact(f"""
+    query GetProjectItem($itemId: ID!{field_variables(field_count)}) {{{RATE_LIMIT_SELECTION}
+        node(id: $itemId) {{
+            ... on ProjectV2Item {{
+                id
+                updatedAt{ITEM_PROJECT_SELECTION}{field_selections(field_count)}
+                content {{
+                    ... on Issue {{{issue_selection()}
+                    }}
+                }}
+            }}
+        }}
+    }}
+    """)
+
+
+@functools.lru_cache(maxsize=None)
+def issue_document():
+    """
+    Build the GetIssue document reading a single issue
+    """
+    return compact(f"""
+    query GetIssue($issueId: ID!) {{{RATE_LIMIT_SELECTION}
+        node(id: $issueId) {{
+            ... on Issue {{{issue_selection()}
+            }}
+        }}
+    }}
+    """)
+
+
+@functools.lru_cache(maxsize=None)
+def issue_project_items_document(field_count):
+    """
+    Build the GetIssueProjectItems document reading every project item of an
+    issue once per number of fields
+    """
+    return compact(f"""
+    query GetIssueProjectItems($issueId: ID!{field_variables(field_count)}) {{{RATE_LIMIT_SELECTION}
+        node(id: $issueId) {{
+            ... on Issue {{{issue_selection()}
+                projectItems(first: 20) {{
+                    nodes {{
+                        id
+                        updatedAt{ITEM_PROJECT_SELECTION}{field_selections(field_count)}
+                    }}
+                }}
+            }}
+        }}
+    }}
+    """)
+
+
+@functools.lru_cache(maxsize=None)
+def add_issue_comments_document(count):
+    """
+    Build the aliased AddIssueComments mutation once per batch size
+    """
+    variables_definition = ', '.join(
+        f'$subject{index}: ID!, $body{index}: String!' for index in range(count)
+    )
+    selections = ''.join(
+        f"""
+        comment{index}: addComment(input: {{subjectId: $subject{index}, body: $body{index}}}) {{
+            clientMutationId
+        }}"""
+        for index in range(count)
+    )
+    return compact(f"""
+    mutation AddIssueComments({variables_definition}) {{{selections}
+    }}
+    """)
+
+
+@functools.lru_cache(maxsize=None)
+def update_issue_comments_document(count):
+    """
+    Build the aliased UpdateIssueComments mutation once per batch size
+    """
+    variables_definition = ', '.join(
+        f'$comment{index}: ID!, $body{index}: String!' for index in range(count)
+    )
+    selections = ''.join(
+        f"""
+        comment{index}: updateIssueComment(input: {{id: $comment{index}, body: $body{index}}}) {{
+            clientMutationId
+        }}"""
+        for index in range(count)
+    )
+    return compact(f"""
+    mutation UpdateIssueComments({variables_definition}) {{{selections}
+    }}
+    """)
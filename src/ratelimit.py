@@ -0,0 +1,267 @@
+import functools
+import re
+import threading
+import time
+from datetime import datetime
+from logger import logger
+
+OPERATION_PATTERN = re.compile(r'\b(?:query|mutation)\s+(\w+)')
+
+
+class RateLimitExceeded(Exception):
+    """Raised when the remaining budget cannot cover the next request before the run must end"""
+
+
+@functools.lru_cache(maxsize=256)
+def operation_name(document):
+    """
+    Return the operation name declared by the given GraphQL document
+    """
+    match = OPERATION_PATTERN.search(document)
+    return match.group(1) if match else 'anonymous'
+
+
+def parse_reset_at(value):
+    """
+    Return the epoch seconds for an ISO 8601 resetAt timestamp
+    """
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+
+
+class RateLimitScheduler:
+    """
+    Track the point budget reported by GitHub and pace requests so a run
+    finishes inside it instead of running out half way through a scan
+    """
+
+    def __init__(self, reserve=100, max_wait=120, content_per_minute=80, content_per_hour=500,
+                 clock=time.time, sleep=time.sleep):
+        self.reserve = reserve
+        self.max_wait = max_wait
+        self.content_limits = [(60, content_per_minute), (3600, content_per_hour)]
+        self.clock = clock
+        self.sleep = sleep
+        self.created = []
+        self.content_created = 0
+
+        # Shared by the synchronous scan and the asyncio engine
+        self.lock = threading.RLock()
+
+        self.limit = None
+        self.remaining = None
+        self.reset_at = None
+
+        self.costs = {}
+        self.requests = {}
+        self.planned = {}
+        self.used = 0
+        self.waited = 0.0
+
+    def estimate(self, operation):
+        """
+        Return the expected point cost of one request of the given operation
+        """
+        costs = self.costs.get(operation)
+        if not costs:
+            return 1
+        return costs / self.requests[operation]
+
+    def plan(self, operation, count):
+        """
+        Record how many more requests of the given operation the run expects to send
+        """
+        self.planned[operation] = max(0, count)
+
+    def projected_cost(self):
+        """
+        Return the predicted point cost of every request still planned for this run
+        """
+        return sum(self.estimate(operation) * count for operation, count in self.planned.items())
+
+    def before_request(self, operation):
+        """
+        Block until the next request of the given operation fits inside the budget
+        """
+        for wait in self.request_waits(operation):
+            self.sleep(wait)
+
+    def request_waits(self, operation):
+        """
+        Yield how long to sleep before the next request of the given operation
+        fits inside the budget. The waits are worked out under the lock and slept
+        by the caller outside of it, so other threads and the asyncio engine
+        keep sending and recording responses in the meantime.
+        """
+        with self.lock:
+            if self.planned.get(operation):
+                self.planned[operation] -= 1
+
+        while True:
+            with self.lock:
+                wait, reset_at = self.request_wait(operation)
+            if not wait and reset_at is None:
+                return
+
+            yield self.waiting(wait)
+            if reset_at is None:
+                # A paced request only needed spreading out
+                return
+
+            with self.lock:
+                if self.reset_at == reset_at:
+                    # The next response reports the budget of the new window
+                    self.remaining = None
+
+    def request_wait(self, operation):
+        """
+        Return how long the next request of the given operation has to wait, and
+        the reset it waits for when nothing is left of the current window
+        """
+        if self.remaining is None or self.reset_at is None:
+            return 0, None
+
+        cost = self.estimate(operation)
+        until_reset = max(0.0, self.reset_at - self.clock())
+        available = self.remaining - self.reserve
+
+        if available < cost:
+            # Nothing left for this window: wait for the reset or defer to the next run
+            if until_reset > self.max_wait:
+                raise RateLimitExceeded(
+                    f'{self.remaining} points remaining, budget resets in {int(until_reset)}s'
+                )
+            logger.info(f'Rate limit budget exhausted, waiting {int(until_reset)}s for the reset')
+            return until_reset, self.reset_at
+
+        projected = self.projected_cost() + cost
+        if projected > available and until_reset > 0:
+            # Spread what is left of the budget over the rest of the window
+            return min(until_reset * cost / available, self.max_wait), None
+
+        return 0, None
+
+    def before_content(self, count):
+        """
+        Block until count more pieces of content can be created without crossing
+        GitHub's content creation limits
+        """
+        for wait in self.content_waits(count):
+            self.sleep(wait)
+
+    def content_waits(self, count):
+        """
+        Yield how long to sleep before count more pieces of content can be
+        created, checking the windows again after every wait, and claim their
+        slots once they fit
+        """
+        while True:
+            with self.lock:
+                wait = self.content_wait(count)
+                if not wait:
+                    now = self.clock()
+                    self.created = [created for created in self.created if now - created < 3600]
+                    self.created.extend([now] * count)
+                    self.content_created += count
+                    return
+
+            logger.info(f'Content creation limit reached, waiting {int(wait)}s')
+            yield self.waiting(wait)
+
+    def content_wait(self, count):
+        """
+        Return how long count more pieces of content have to wait for enough of
+        the oldest creations to leave every window
+        """
+        wait = 0
+        now = self.clock()
+        for window, limit in self.content_limits:
+            if count > limit:
+                raise RateLimitExceeded(f'{count} comments exceed the limit of {limit} per {window}s')
+
+            recent = [created for created in self.created if now - created < window]
+            if len(recent) + count > limit:
+                wait = max(wait, recent[len(recent) + count - limit - 1] + window - now)
+
+        if wait > self.max_wait:
+            raise RateLimitExceeded(f'Content creation limit reached, {int(wait)}s until the next slot')
+        return wait
+
+    def record(self, operation, headers, body):
+        """
+        Update the budget from the rateLimit selection or the X-RateLimit-* headers
+        of a response and return the points it cost
+        """
+        with self.lock:
+            previous = self.remaining
+            cost = None
+
+            rate_limit = ((body or {}).get('data') or {}).get('rateLimit')
+            if rate_limit:
+                cost = rate_limit.get('cost')
+                self.remaining = rate_limit.get('remaining', self.remaining)
+                self.limit = rate_limit.get('limit', self.limit)
+                if rate_limit.get('resetAt'):
+                    self.reset_at = parse_reset_at(rate_limit['resetAt'])
+            elif headers and 'X-RateLimit-Remaining' in headers:
+                self.remaining = int(headers['X-RateLimit-Remaining'])
+                if 'X-RateLimit-Limit' in headers:
+                    self.limit = int(headers['X-RateLimit-Limit'])
+                if 'X-RateLimit-Reset' in headers:
+                    self.reset_at = float(headers['X-RateLimit-Reset'])
+
+            if cost is None:
+                cost = previous - self.remaining if previous is not None and self.remaining is not None else 1
+                cost = max(cost, 1)
+
+            self.costs[operation] = self.costs.get(operation, 0) + cost
+            self.requests[operation] = self.requests.get(operation, 0) + 1
+            self.used += cost
+            return cost
+
+    def snapshot(self):
+        """
+        Return the usage counters so far, for summary to count from
+        """
+        with self.lock:
+            return {
+                'used': self.used,
+                'waited': self.waited,
+                'content_created': self.content_created,
+                'costs': dict(self.costs),
+                'requests': dict(self.requests),
+            }
+
+    def summary(self, since=None):
+        """
+        Return the budget used since the given snapshot, or since the scheduler
+        was created. A long-running service keeps one scheduler across its runs.
+        """
+        now = self.snapshot()
+        since = since or {'used': 0, 'waited': 0.0, 'content_created': 0, 'costs': {}, 'requests': {}}
+        requests = {
+            operation: count - since['requests'].get(operation, 0)
+            for operation, count in now['requests'].items()
+        }
+        return {
+            'used': now['used'] - since['used'],
+            'requests': sum(requests.values()),
+            'remaining': self.remaining,
+            'limit': self.limit,
+            'reset_at': self.reset_at,
+            'waited': round(now['waited'] - since['waited'], 3),
+            'content_created': now['content_created'] - since['content_created'],
+            'operations': {
+                operation: {'requests': requests[operation], 'cost': cost - since['costs'].get(operation, 0)}
+                for operation, cost in now['costs'].items()
+                if requests[operation]
+            },
+        }
+
+    def waiting(self, seconds):
+        """
+        Count a wait about to be slept and return its length
+        """
+        seconds = max(0.0, seconds)
+        with self.lock:
+            self.waited += seconds
+        return seconds
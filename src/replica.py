@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from models import ProjectItem
+
+# Layout of the stored items, bumped whenever it changes
+SCHEMA_VERSION = 3
+
+
+class ProjectReplica:
+    """
+    Local copy of the items, field values and issue state of one or more
+    projects, kept current with incremental syncs between runs. Every method
+    takes the scope of one project, e.g. 'owner/1'. selection is the issue
+    selection of the queries the records are built from.
+    """
+
+    def __init__(self, path, selection='', clock=time.time):
+        self.path = path
+        self.clock = clock
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # The asyncio engine reads the store from its scan thread as well
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+
+        # The replica is only a cache, rebuild the ones written in an older layout
+        if self.connection.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+            self.connection.executescript(f'''
+                DROP TABLE IF EXISTS items;
+                DROP TABLE IF EXISTS sync;
+                PRAGMA user_version = {SCHEMA_VERSION};
+            ''')
+
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS items (
+                item_id TEXT NOT NULL,
+                scope TEXT NOT NULL,
+                state TEXT,
+                updated_at TEXT,
+                record TEXT NOT NULL,
+                synced_at REAL NOT NULL,
+                PRIMARY KEY (scope, item_id)
+            );
+            CREATE INDEX IF NOT EXISTS items_scope_state ON items (scope, state);
+            CREATE TABLE IF NOT EXISTS sync (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            """
+        )
+
+        # The records hold the issue fields the scans select, which differ between
+        # notification types, so a replica synced with another selection starts over
+        selection = hashlib.sha1(selection.encode()).hexdigest()[:12]
+        if self.get_sync_value('replica', 'selection') != selection:
+            self.connection.executescript('DELETE FROM items; DELETE FROM sync;')
+            self.set_sync_value('replica', 'selection', selection)
+        self.connection.commit()
+
+    def get_sync_value(self, scope, key):
+        row = self.connection.execute('SELECT value FROM sync WHERE key = ?', (f'{scope}:{key}',)).fetchone()
+        return row[0] if row else None
+
+    def set_sync_value(self, scope, key, value):
+        self.connection.execute(
+            'INSERT OR REPLACE INTO sync (key, value) VALUES (?, ?)',
+            (f'{scope}:{key}', str(value))
+        )
+
+    def high_water_mark(self, scope):
+        """
+        Return the latest updatedAt seen on any item or issue, or None before the first sync
+        """
+        return self.get_sync_value(scope, 'high_water_mark')
+
+    def needs_full_sync(self, scope, interval_hours):
+        """
+        Check if the replica is empty or its last full sync is older than the given interval
+        """
+        last_full_sync = self.get_sync_value(scope, 'last_full_sync')
+        if last_full_sync is None or self.high_water_mark(scope) is None:
+            return True
+        return bool(interval_hours) and self.clock() - float(last_full_sync) > interval_hours * 3600
+
+    def incremental_query(self, scope):
+        """
+        Return the project filter selecting the items updated since the previous sync.
+        The filter works on whole days, so the previous day is included as a safety margin.
+        """
+        high_water = datetime.fromisoformat(self.high_water_mark(scope).replace('Z', '+00:00'))
+        return f'updated:>={(high_water - timedelta(days=1)).date().isoformat()}'
+
+    def sync(self, scope, records, full=False):
+        """
+        Store the given ProjectItem records. A full sync also drops the items
+        that no longer exist on the project.
+        """
+        started_at = self.clock()
+        high_water = self.high_water_mark(scope) or ''
+        count = 0
+
+        for record in records:
+            issue = record.issue
+            updated_at = max(record.updated_at or '', (issue.updated_at if issue else None) or '')
+            high_water = max(high_water, updated_at)
+
+            self.connection.execute(
+                'INSERT OR REPLACE INTO items (item_id, scope, state, updated_at, record, synced_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (record.id, scope, issue.state if issue else None, updated_at, json.dumps(record.to_record()), started_at)
+            )
+            count += 1
+
+        if full:
+            self.connection.execute('DELETE FROM items WHERE scope = ? AND synced_at < ?', (scope, started_at))
+            self.set_sync_value(scope, 'last_full_sync', started_at)
+        if high_water:
+            self.set_sync_value(scope, 'high_water_mark', high_water)
+
+        self.connection.commit()
+        return count
+
+    def closed_items(self, scope):
+        """
+        Yield a ProjectItem for every closed item of the project held in the replica
+        """
+        cursor = self.connection.execute("SELECT record FROM items WHERE scope = ? AND state = 'CLOSED'", (scope,))
+        for (record,) in cursor:
+            yield ProjectItem.from_record(json.loads(record))
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,166 @@
+import json
+import signal
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logger import logger
+import config
+import graphql
+import main
+
+
+class ServiceState:
+    """
+    Health and progress of the long-running service, shared with the HTTP endpoint
+    """
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.started_at = clock()
+        self.cycles = 0
+        self.failures = 0
+        self.interval = config.daemon_min_interval
+        self.last_started_at = None
+        self.last_success_at = None
+        self.last_duration = None
+        self.last_stats = {}
+        self.totals = {}
+        self.lock = threading.Lock()
+
+    def cycle_finished(self, started_at, stats=None):
+        with self.lock:
+            self.cycles += 1
+            self.last_duration = self.clock() - started_at
+            if stats is None:
+                self.failures += 1
+                return
+            self.last_success_at = self.clock()
+            self.last_stats = stats
+            for key, value in stats.items():
+                self.totals[key] = self.totals.get(key, 0) + value
+
+    def is_healthy(self):
+        """
+        Check that a cycle succeeded recently enough for the current polling interval
+        """
+        with self.lock:
+            reference = self.last_success_at or self.started_at
+            return self.clock() - reference <= 2 * config.daemon_max_interval + config.read_timeout
+
+    def metrics(self):
+        """
+        Return the service metrics in the Prometheus text format
+        """
+        with self.lock:
+            lines = [
+                '# TYPE missing_fields_cycles_total counter',
+                f'missing_fields_cycles_total {self.cycles}',
+                '# TYPE missing_fields_cycle_failures_total counter',
+                f'missing_fields_cycle_failures_total {self.failures}',
+                '# TYPE missing_fields_poll_interval_seconds gauge',
+                f'missing_fields_poll_interval_seconds {self.interval}',
+                '# TYPE missing_fields_last_cycle_duration_seconds gauge',
+                f'missing_fields_last_cycle_duration_seconds {self.last_duration or 0}',
+                '# TYPE missing_fields_last_success_timestamp_seconds gauge',
+                f'missing_fields_last_success_timestamp_seconds {self.last_success_at or 0}',
+            ]
+            for key, value in sorted(self.totals.items()):
+                lines.append(f'# TYPE missing_fields_{key}_total counter')
+                lines.append(f'missing_fields_{key}_total {value}')
+
+        remaining = graphql.get_client().scheduler.remaining
+        if remaining is not None:
+            lines.append('# TYPE missing_fields_rate_limit_remaining gauge')
+            lines.append(f'missing_fields_rate_limit_remaining {remaining}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def next_interval(interval, stats):
+    """
+    Tighten the polling interval after a cycle that saw closed items change and
+    back off exponentially while the board stays quiet. Pending and notified
+    issues are no sign of change: without a ledger, in a dry run or with
+    unreachable assignees the same issues come back every cycle.
+    """
+    if stats and stats.get('changed'):
+        return config.daemon_min_interval
+    return min(config.daemon_max_interval, interval * 2)
+
+
+def create_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == '/healthz':
+                healthy = state.is_healthy()
+                self.respond(200 if healthy else 503, 'application/json', json.dumps({
+                    'healthy': healthy,
+                    'cycles': state.cycles,
+                    'last_success_at': state.last_success_at,
+                }))
+            elif self.path == '/metrics':
+                self.respond(200, 'text/plain; version=0.0.4', state.metrics())
+            else:
+                self.respond(404, 'text/plain', 'Not found\n')
+
+        def respond(self, status, content_type, body):
+            body = body.encode()
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve():
+    """
+    Keep the process, its connections, ledger and replica alive and run a cycle
+    every polling interval until SIGTERM or SIGINT
+    """
+    logger.info('Service started...')
+    if config.dry_run:
+        logger.info('DRY RUN MODE ON!')
+
+    state = ServiceState()
+    stop = threading.Event()
+
+    def request_stop(signum, frame):
+        logger.info('Stopping the service...')
+        stop.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    server = None
+    if config.daemon_port:
+        server = ThreadingHTTPServer(('0.0.0.0', config.daemon_port), create_handler(state))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        logger.info(f'Health and metrics endpoint listening on port {config.daemon_port}')
+
+    ledger, replica = main.open_stores()
+    try:
+        while not stop.is_set():
+            started_at = time.time()
+            state.last_started_at = started_at
+            try:
+                stats = main.run(ledger=ledger, replica=replica)
+            except Exception as e:
+                logger.exception(f'Cycle failed: {e}')
+                stats = None
+            state.cycle_finished(started_at, stats)
+
+            state.interval = next_interval(state.interval, stats)
+            logger.info(f'Next cycle in {state.interval}s')
+            stop.wait(state.interval)
+    finally:
+        if server:
+            server.shutdown()
+        if ledger:
+            ledger.close()
+        if replica:
+            replica.close()
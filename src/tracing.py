@@ -0,0 +1,129 @@
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from logger import logger
+
+
+class Tracer:
+    """
+    Timeline of one run recorded as spans, exported in the Chrome trace event
+    format that Perfetto and chrome://tracing open. Every thread, and every
+    asyncio task, gets its own track so concurrent spans never interleave.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.started_at = clock()
+        self.lock = threading.Lock()
+        self.events = []
+        self.tracks = {}
+
+    def track(self):
+        """
+        Return the id of the track of the calling thread or asyncio task
+        """
+        name = threading.current_thread().name
+        key = threading.get_ident()
+
+        # Only look for a task when asyncio is in use, without importing it
+        asyncio = sys.modules.get('asyncio')
+        if asyncio:
+            try:
+                task = asyncio.current_task()
+            except RuntimeError:
+                task = None
+            if task:
+                name = task.get_name()
+                key = (key, name)
+
+        with self.lock:
+            if key not in self.tracks:
+                self.tracks[key] = len(self.tracks) + 1
+                self.events.append({
+                    'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': self.tracks[key], 'args': {'name': name},
+                })
+            return self.tracks[key]
+
+    def timestamp(self, at):
+        return round((at - self.started_at) * 1e6, 3)
+
+    @contextmanager
+    def span(self, name, category, **attributes):
+        """
+        Record the enclosed block as a span. The attributes dict is yielded so
+        the block can add what it only learns along the way, like a response size.
+        """
+        track = self.track()
+        started_at = self.clock()
+        try:
+            yield attributes
+        except BaseException as e:
+            attributes['error'] = repr(e)
+            raise
+        finally:
+            finished_at = self.clock()
+            event = {
+                'name': name,
+                'cat': category,
+                'ph': 'X',
+                'ts': self.timestamp(started_at),
+                'dur': round((finished_at - started_at) * 1e6, 3),
+                'pid': 1,
+                'tid': track,
+                'args': {key: value for key, value in attributes.items() if value is not None},
+            }
+            with self.lock:
+                self.events.append(event)
+
+    def chrome_trace(self):
+        """
+        Return the recorded spans as a Chrome trace event document
+        """
+        with self.lock:
+            events = sorted(self.events, key=lambda event: event.get('ts', -1))
+        process = {'name': 'process_name', 'ph': 'M', 'pid': 1, 'args': {'name': 'missing-fields'}}
+        return {'traceEvents': [process] + events, 'displayTimeUnit': 'ms'}
+
+    def write(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w') as file:
+            json.dump(self.chrome_trace(), file)
+
+
+_tracer = None
+
+
+@contextmanager
+def traced(path):
+    """
+    Trace the enclosed block and write the Chrome trace to the path; an empty
+    path disables tracing
+    """
+    global _tracer
+    if not path:
+        yield
+        return
+
+    _tracer = Tracer()
+    try:
+        yield
+    finally:
+        tracer, _tracer = _tracer, None
+        try:
+            tracer.write(path)
+            logger.info(f'Trace of {len(tracer.events)} events written to {path}')
+        except OSError as e:
+            logger.warning(f'Could not write the trace: {e}')
+
+
+def span(name, category='', **attributes):
+    """
+    Return a context manager recording the enclosed block as a span of the
+    active trace and yielding its attributes, or only yielding them when not tracing
+    """
+    return _tracer.span(name, category, **attributes) if _tracer else nullcontext(attributes)
@@ -1,8 +1,42 @@
+import hashlib
+import re
 import graphql
 import config
+import tracing
 from logger import logger
 
-def prepare_missing_fields_comment(issue: dict, assignees: dict):
+# Start of the hidden marker every notice ends with
+NOTICE_MARKER_PREFIX = '<!-- missing-fields:'
+
+# Fixed start of the notice text, after the assignee mentions
+NOTICE_PREFIX = 'Kindly set the missing required fields for the project:'
+MENTIONS_PATTERN = re.compile(r'(?:@[\w-]+\s+)*')
+
+def get_missing_fields(item, field_names: list):
+    """
+    Return the names of the fields that have no value on the given project item
+    """
+    return [field_name for field_name in field_names if field_name not in item.fields]
+
+def missing_fields_fingerprint(missing_fields: list):
+    """
+    Return a short stable fingerprint of the given set of missing fields
+    """
+    return hashlib.sha1('\n'.join(sorted(missing_fields)).encode()).hexdigest()[:12]
+
+def missing_fields_notice(missing_fields: list):
+    """
+    Return the notice text that lists the given missing fields
+    """
+    return f'{NOTICE_PREFIX} {", ".join(missing_fields)}.'
+
+def is_notice_text(body: str):
+    """
+    Check whether a comment body is a notice, whichever fields it lists
+    """
+    return body[MENTIONS_PATTERN.match(body).end():].startswith(NOTICE_PREFIX)
+
+def prepare_missing_fields_comment(issue, assignees: tuple, missing_fields: list):
     """
     Prepare the comment from the given arguments and return it
     """
@@ -10,20 +44,143 @@ def prepare_missing_fields_comment(issue: dict, assignees: dict):
     comment = ''
     if assignees:
         for assignee in assignees:
-            comment += f'@{assignee["login"]} '
+            comment += f'@{assignee} '
     else:
-        logger.info(f'No assignees found for issue #{issue["number"]}')
+        logger.info(f'No assignees found for issue #{issue.number}')
+
+    comment += missing_fields_notice(missing_fields)
+    logger.info(f'Issue {issue.title} | {comment}')
 
-    comment += f'Kindly set the missing required fields for the project: Status, Due Date, Time Spent, Release, Estimate, Priority, Size, Week.'
-    logger.info(f'Issue {issue["title"]} | {comment}')
+    # Lets later runs recognise the notice and the missing fields it lists without matching its text
+    comment += f'\n\n{notice_marker(missing_fields_fingerprint(missing_fields))}'
 
     return comment
 
-def check_comment_exists(issue_id, comment_text):
-    """Check if the comment already exists on the issue."""
-    comments = graphql.get_issue_comments(issue_id)
+def notice_marker(fingerprint: str):
+    """
+    Return the hidden marker identifying a notice and the missing fields it was written for
+    """
+    return f'<!-- missing-fields:{fingerprint} -->'
+
+def comment_fingerprint(comment: dict):
+    """
+    Return the fingerprint of the notice marker the comment carries, or None
+    """
+    body = comment.get('body') or ''
+    start = body.rfind(NOTICE_MARKER_PREFIX)
+    if start < 0:
+        return None
+    end = body.find(' -->', start)
+    return body[start + len(NOTICE_MARKER_PREFIX):end] if end > 0 else None
+
+def find_notice(comments, notice):
+    """
+    Look for the notice among the comments, newest first. notice is the
+    (text, fingerprint) pair of the expected notice. Return ('current', comment_id)
+    when a comment carries its marker, or its text for notices posted before
+    the markers, ('stale', comment_id) when the newest notice of the token's
+    own account was written for other missing fields, marked or not, or None.
+    """
+    text, fingerprint = notice
     for comment in comments:
-        if comment_text in comment.get('body', ''):
-            return True
-    return False
+        body = comment.get('body') or ''
+        marked = comment_fingerprint(comment)
+        if marked == fingerprint or (marked is None and text in body):
+            return 'current', comment.get('id')
+        if comment.get('viewerDidAuthor') and (marked or is_notice_text(body)):
+            # Notices posted before the markers are edited in place like the marked ones
+            return 'stale', comment['id']
+    return None
+
+def recent_notices(notices, recent):
+    """
+    Look for the notice of each issue among the comments fetched with its
+    batch. recent yields (issue_id, comments, earlier) with the comments newest
+    first and earlier locating the older comments, falsy when there are none.
+    Return the notices found, keyed by issue id, and the (issue_id, earlier)
+    pairs of the issues whose notice may be older than the comments fetched.
+    The issues recent left out, their comments could not be read, are found
+    as ('unchecked', None).
+    """
+    found = dict.fromkeys(notices, ('unchecked', None))
+    unresolved = []
+    for issue_id, comments, earlier in recent:
+        notice = find_notice(comments, notices[issue_id])
+        if notice:
+            found[issue_id] = notice
+        else:
+            del found[issue_id]
+            if earlier:
+                unresolved.append((issue_id, earlier))
+    return found, unresolved
+
+def merge_notices(found, unresolved, earlier_notices):
+    """
+    Add the notices found in the older comments of the unresolved issues to
+    the found ones and return them
+    """
+    for (issue_id, _), notice in zip(unresolved, earlier_notices):
+        if notice:
+            found[issue_id] = notice
+    return found
+
+def find_notices(notices):
+    """
+    Return the notice found on each issue, keyed by issue id, as find_notice
+    returns it, or ('unchecked', None) when its comments could not be read.
+    notices holds the expected (text, fingerprint) of each issue,
+    keyed by issue id.
+
+    The tail scan reads each issue's comments newest first, keeps the ones
+    written by the token's own account and stops at the first one carrying a
+    notice; the full scan reads every comment.
+    """
+    if config.comment_scan == 'tail':
+        recent = graphql.get_issues_own_comments(list(notices), batch_size=config.comment_batch_size)
+        earlier = graphql.get_issue_own_comments
+    else:
+        recent = (
+            (issue_id, reversed(comments), not complete)
+            for issue_id, comments, complete in graphql.get_issues_comments(list(notices), batch_size=config.comment_batch_size)
+        )
+
+        def earlier(issue_id, _):
+            return reversed(list(graphql.get_issue_comments(issue_id)))
+
+    found, unresolved = recent_notices(notices, recent)
+
+    def earlier_notice(issue_id, before):
+        with tracing.span('get_issue_comments', 'pagination', issue=issue_id):
+            return find_notice(earlier(issue_id, before), notices[issue_id])
+
+    return merge_notices(found, unresolved, (earlier_notice(*entry) for entry in unresolved))
+
+async def find_notices_async(notices):
+    """
+    Asyncio variant of find_notices, looking up every batch and every long
+    comment history concurrently
+    """
+    import asyncio
+    import async_graphql
+    from contextlib import aclosing
+
+    if config.comment_scan == 'tail':
+        own_comments = await async_graphql.get_issues_own_comments(list(notices), batch_size=config.comment_batch_size)
+        recent = ((issue_id, comments, before) for issue_id, (comments, before) in own_comments.items())
+
+        async def earlier_notice(issue_id, before):
+            async with aclosing(async_graphql.get_issue_own_comments(issue_id, before)) as pages:
+                async for comments in pages:
+                    notice = find_notice(comments, notices[issue_id])
+                    if notice:
+                        return notice
+            return None
+    else:
+        comments_by_issue = await async_graphql.get_issues_comments(list(notices), batch_size=config.comment_batch_size)
+        recent = ((issue_id, reversed(comments), not complete) for issue_id, (comments, complete) in comments_by_issue.items())
+
+        async def earlier_notice(issue_id, _):
+            return find_notice(reversed(await async_graphql.get_issue_comments(issue_id)), notices[issue_id])
 
+    found, unresolved = recent_notices(notices, recent)
+    return merge_notices(found, unresolved, await asyncio.gather(*(earlier_notice(*entry) for entry in unresolved)))
@@ -0,0 +1,238 @@
+import hashlib
+import hmac
+import json
+import queue
+import signal
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logger import logger
+import config
+import graphql
+import main
+from models import IssueRef, ProjectItem
+
+# The webhook events and actions that can leave a closed issue with missing fields
+SUPPORTED_EVENTS = [
+    ('issues', 'closed'),
+    ('projects_v2_item', 'edited'),
+]
+
+
+def verify_signature(secret, body, signature):
+    """
+    Check the X-Hub-Signature-256 header of a delivery against the HMAC of its body
+    """
+    if not signature or not signature.startswith('sha256='):
+        return False
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature[len('sha256='):])
+
+
+def is_supported(event, payload):
+    return (event, payload.get('action')) in SUPPORTED_EVENTS
+
+
+def is_configured_project(project):
+    """
+    Check if the owner and number of a project match one of the configured projects
+    """
+    owner = (project.get('owner') or '').lower()
+    return any(
+        owner == target['owner'].lower() and project.get('project_number') == target['project_number']
+        for target in config.projects
+    )
+
+
+def is_configured_repository(repository):
+    """
+    Check if the owner/name of a repository matches one of the configured repositories
+    """
+    full_name = (repository.get('full_name') or '').lower()
+    return any(
+        full_name == f"{target['owner']}/{target['repository']}".lower()
+        for target in config.repositories
+    )
+
+
+def payload_issue(issue):
+    """
+    Return the issue of an issues event as the IssueRef the GraphQL queries
+    build. Payloads carry no assignee email addresses, so email notices read
+    the issue from the API instead.
+    """
+    if config.notification_type == 'email':
+        return graphql.get_issue(issue['node_id'])
+
+    return IssueRef(
+        issue['node_id'],
+        issue['title'],
+        issue['number'],
+        'CLOSED',
+        issue.get('updated_at'),
+        tuple(assignee['login'] for assignee in issue.get('assignees') or []),
+        url=issue.get('html_url'),
+    )
+
+
+def event_records(event, payload):
+    """
+    Return the records of the closed issues affected by the event, in the
+    shape main.get_project_items yields them
+    """
+    if not config.is_enterprise:
+        # Repository issues carry no project field values
+        if event == 'issues' and is_configured_repository(payload.get('repository') or {}):
+            issue = payload_issue(payload['issue'])
+            return [ProjectItem(None, None, (), issue)] if issue else []
+        return []
+
+    if event == 'issues':
+        records = graphql.get_issue_project_items(payload['issue']['node_id'], config.required_field_names)
+    else:
+        item = payload['projects_v2_item']
+        if item.get('content_type') != 'Issue':
+            return []
+        record = graphql.get_project_item(item['node_id'], config.required_field_names)
+        records = [record] if record else []
+        if len(config.projects) > 1 and record and record.issue:
+            # The notice lists the fields missing on every configured project the issue is on
+            records = graphql.get_issue_project_items(record.issue.id, config.required_field_names)
+
+    return [
+        record for record in records
+        if is_configured_project(record.project) and record.issue and record.issue.state == 'CLOSED'
+    ]
+
+
+def handle_event(event, payload, ledger=None):
+    """
+    Evaluate the missing fields of the items affected by one webhook event and
+    notify their assignees like a scheduled run would. Return the run counters.
+    """
+    main.run_stats.clear()
+    if not is_supported(event, payload):
+        return {}
+
+    records = event_records(event, payload)
+    logger.info(f"Event {event}.{payload.get('action')} affects {len(records)} closed items")
+    main.notify_missing_fields(records, ledger=ledger)
+    return dict(main.run_stats)
+
+
+def create_handler(events):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == '/healthz':
+                self.respond(200, {'healthy': True, 'queued': events.qsize()})
+            else:
+                self.respond(404, {'error': 'Not found'})
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            if not verify_signature(config.webhook_secret, body, self.headers.get('X-Hub-Signature-256')):
+                self.respond(401, {'error': 'Invalid signature'})
+                return
+
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                self.respond(400, {'error': 'Invalid JSON payload'})
+                return
+
+            event = self.headers.get('X-GitHub-Event')
+            if not is_supported(event, payload):
+                self.respond(200, {'accepted': False})
+                return
+
+            # Reply right away, GitHub gives up on deliveries that take more than 10 seconds
+            events.put((self.headers.get('X-GitHub-Delivery'), event, payload))
+            self.respond(202, {'accepted': True})
+
+        def respond(self, status, document):
+            body = json.dumps(document).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def process_events(events, ledger=None):
+    """
+    Handle the queued deliveries one at a time until a None entry is queued
+    """
+    while True:
+        delivery = events.get()
+        if delivery is None:
+            return
+
+        delivery_id, event, payload = delivery
+        try:
+            stats = handle_event(event, payload, ledger=ledger)
+            logger.info(f'Delivery {delivery_id} handled: {stats}')
+        except Exception as e:
+            logger.exception(f'Delivery {delivery_id} failed: {e}')
+
+
+def serve():
+    """
+    Receive webhook deliveries until SIGTERM or SIGINT, evaluating each affected item as it arrives
+    """
+    logger.info('Webhook receiver started...')
+    if config.dry_run:
+        logger.info('DRY RUN MODE ON!')
+
+    events = queue.Queue()
+    ledger, replica = main.open_stores()
+    if replica:
+        # Single items are read straight from the API, the replica is only used by the scans
+        replica.close()
+
+    server = ThreadingHTTPServer(('0.0.0.0', config.webhook_port), create_handler(events))
+
+    def request_stop(signum, frame):
+        logger.info('Stopping the webhook receiver...')
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    worker = threading.Thread(target=process_events, args=(events,), kwargs={'ledger': ledger})
+    worker.start()
+    logger.info(f'Listening for webhook deliveries on port {config.webhook_port}')
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        events.put(None)
+        worker.join()
+        if ledger:
+            ledger.close()
+
+
+def replay(event, paths):
+    """
+    Handle recorded webhook payloads without a receiver or signatures
+    """
+    ledger, replica = main.open_stores()
+    try:
+        for path in paths:
+            with open(path) as file:
+                payload = json.load(file)
+            logger.info(f'{path}: {handle_event(event, payload, ledger=ledger)}')
+    finally:
+        if ledger:
+            ledger.close()
+        if replica:
+            replica.close()
+
+
+if __name__ == '__main__':
+    # python webhook.py <event> <payload.json>...
+    replay(sys.argv[1], sys.argv[2:])